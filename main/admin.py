@@ -1,4 +1,106 @@
 from django.contrib import admin
-from .models import VehicleRecord
+from .models import VehicleRecord, Driver, AuditEntry, ReportSnapshot, Vendor, VendorAlias, Depot, DepotMembership, SyncToken
+from . import audit
+from .vendors import merge_vendors, normalize_vendor
 
-admin.site.register(VehicleRecord)
+
+class AuditHistoryMixin:
+    # Show the audit log on the standard "History" page, looked up by object index
+    object_history_template = 'admin/main/object_history.html'
+
+    def history_view(self, request, object_id, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['audit_entries'] = audit.history(self.model, object_id).select_related('user')
+        return super().history_view(request, object_id, extra_context=extra_context)
+
+
+@admin.register(VehicleRecord)
+class VehicleRecordAdmin(AuditHistoryMixin, admin.ModelAdmin):
+    pass
+
+
+@admin.register(Driver)
+class DriverAdmin(AuditHistoryMixin, admin.ModelAdmin):
+    pass
+
+
+class DepotMembershipInline(admin.TabularInline):
+    model = DepotMembership
+    fields = ['user', 'is_admin']
+    autocomplete_fields = ['user']
+    extra = 1
+
+
+@admin.register(Depot)
+class DepotAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code']
+    search_fields = ['name', 'code']
+    inlines = [DepotMembershipInline]
+
+
+class VendorAliasInline(admin.TabularInline):
+    model = VendorAlias
+    fields = ['name']
+    extra = 1
+
+
+@admin.register(Vendor)
+class VendorAdmin(admin.ModelAdmin):
+    list_display = ['name', 'key']
+    search_fields = ['name', 'key', 'aliases__key']
+    readonly_fields = ['key']
+    inlines = [VendorAliasInline]
+    actions = ['merge_into_oldest']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.key = normalize_vendor(obj.name)
+        super().save_model(request, obj, form, change)
+
+    def save_formset(self, request, form, formset, change):
+        aliases = formset.save(commit=False)
+        for alias in aliases:
+            alias.key = normalize_vendor(alias.name)
+            alias.save()
+        for alias in formset.deleted_objects:
+            alias.delete()
+
+    @admin.action(description="Merge selected vendors into the oldest one")
+    def merge_into_oldest(self, request, queryset):
+        vendors = list(queryset.order_by('pk'))
+        merge_vendors(vendors[0], vendors[1:])
+        self.message_user(request, f"Merged {len(vendors) - 1} vendors into {vendors[0].name}.")
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'model_name', 'object_id', 'action', 'user']
+    list_filter = ['model_name', 'action', 'month']
+    search_fields = ['=object_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['name', 'group', 'date_from', 'date_to', 'built_at', 'stale']
+    list_filter = ['name', 'group', 'stale']
+    exclude = ['rows']
+
+
+@admin.register(SyncToken)
+class SyncTokenAdmin(admin.ModelAdmin):
+    # Deleting a token signs its device out
+    list_display = ['user', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'key_hash', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,196 @@
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .archive import archived_records
+from .compare import earlier_period
+from .depots import report_filters
+from .fiscal import bs_string_to_ad
+from .models import VehicleRecord
+
+# Per-process admission control for report, export and record list views
+# (every view that reads records by date range). Reports may
+# only use part of the worker's threads (the rest is kept for bill entry),
+# and exports estimated as heavy get their own, smaller limits. A request
+# over a limit is answered 503 + Retry-After at once; waiting for a slot
+# would hold a worker thread that bill entry needs.
+DEFAULTS = {
+    'MAX_REPORTS': 4,             # report requests in flight per process
+    'MAX_HEAVY': 2,               # heavy report requests in flight per process
+    'MAX_HEAVY_PER_USER': 1,      # heavy report requests in flight per user
+    'HEAVY_ROWS': 20000,          # estimated rows at which a request counts as heavy
+    'RETRY_AFTER': 30,            # seconds suggested to rejected clients
+}
+
+
+def config(name):
+    return getattr(settings, 'REPORT_ADMISSION', {}).get(name, DEFAULTS[name])
+
+
+class AdmissionController:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reports = 0
+        self.heavy = 0
+        self.heavy_by_user = {}
+        self.counters = {'admitted': 0, 'admitted_heavy': 0, 'rejected': 0}
+
+    def acquire_report(self):
+        with self.lock:
+            if self.reports >= config('MAX_REPORTS'):
+                self.counters['rejected'] += 1
+                return False
+            self.reports += 1
+            self.counters['admitted'] += 1
+            return True
+
+    def release_report(self):
+        with self.lock:
+            self.reports -= 1
+
+    def acquire_heavy(self, user_id):
+        with self.lock:
+            if (self.heavy >= config('MAX_HEAVY')
+                    or self.heavy_by_user.get(user_id, 0) >= config('MAX_HEAVY_PER_USER')):
+                self.counters['rejected'] += 1
+                return False
+            self.heavy += 1
+            self.heavy_by_user[user_id] = self.heavy_by_user.get(user_id, 0) + 1
+            self.counters['admitted_heavy'] += 1
+            return True
+
+    def release_heavy(self, user_id):
+        with self.lock:
+            self.heavy -= 1
+            self.heavy_by_user[user_id] -= 1
+            if not self.heavy_by_user[user_id]:
+                del self.heavy_by_user[user_id]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'reports_in_flight': self.reports,
+                'heavy_in_flight': self.heavy,
+                'heavy_users': len(self.heavy_by_user),
+                'limits': {name: config(name) for name in DEFAULTS},
+                **self.counters,
+            }
+
+
+controller = AdmissionController()
+
+
+def too_busy(message):
+    response = HttpResponse(message, status=503, content_type='text/plain')
+    response['Retry-After'] = str(config('RETRY_AFTER'))
+    return response
+
+
+def request_params(request):
+    # The bulk edit form posts its filters
+    return request.POST if request.method == 'POST' else request.GET
+
+
+def report_periods(request):
+    """The AD date ranges a request reads records for: its from/to dates, if valid."""
+    params = request_params(request)
+    ad_from = bs_string_to_ad(params.get('from_date') or '')
+    ad_to = bs_string_to_ad(params.get('to_date') or '')
+    if not ad_from or not ad_to or ad_from > ad_to:
+        return []
+    return [(ad_from, ad_to)]
+
+
+def compared_periods(request):
+    # The comparison report also reads the period it is compared against
+    periods = report_periods(request)
+    if periods:
+        previous = earlier_period(*periods[0], request.GET.get('compare'))
+        if previous:
+            periods.append(previous)
+    return periods
+
+
+def no_scope(request):
+    return {}
+
+
+def estimate_rows(request, periods=None, driver_param='driver', scope=no_scope):
+    """COUNT of the records a request would read, using its standard filters.
+
+    driver_param names the parameter that holds the view's driver filter,
+    and scope(request) gives any further filters the view applies.
+    """
+    if periods is None:
+        periods = report_periods(request)
+    params = request_params(request)
+
+    filters = {}
+    # Same as the views: a driver id that isn't a number means no driver filter
+    driver_id = params.get(driver_param, '')
+    if driver_id.isdigit():
+        filters['driver_id'] = int(driver_id)
+    if params.get('vehicle_number'):
+        # Case-insensitive like the vehicle summary, so it never undercounts
+        filters['vehicle_number__iexact'] = params['vehicle_number']
+    filters.update(report_filters(request))
+    filters.update(scope(request))
+
+    rows = 0
+    for ad_from, ad_to in periods:
+        rows += VehicleRecord.objects.filter(date__gte=ad_from, date__lte=ad_to, **filters).count()
+        rows += archived_records(ad_from, ad_to).filter(**filters).count()
+    return rows
+
+
+def admission_controlled(view=None, *, periods=report_periods, driver_param='driver', scope=no_scope):
+    """Take a report slot for every request to the view, and a heavy one when
+    the records it reads over `periods(request)` reach HEAVY_ROWS."""
+    if view is None:
+        return lambda view: admission_controlled(view, periods=periods, driver_param=driver_param, scope=scope)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not controller.acquire_report():
+            return too_busy("Too many reports are running right now. Please try again shortly.")
+
+        releases = [controller.release_report]
+        handed_off = False
+        try:
+            if estimate_rows(request, periods(request), driver_param, scope) >= config('HEAVY_ROWS'):
+                if not controller.acquire_heavy(request.user.pk):
+                    return too_busy("Too many large reports are running. Please try again shortly.")
+                releases.append(lambda: controller.release_heavy(request.user.pk))
+
+            response = view(request, *args, **kwargs)
+            if response.streaming:
+                # Keep the slots until the export has been fully sent
+                response.streaming_content = ReleasingIterator(response.streaming_content, releases)
+                handed_off = True
+            return response
+        finally:
+            if not handed_off:
+                for release in reversed(releases):
+                    release()
+    return wrapper
+
+
+class ReleasingIterator:
+    # Streams the export and frees its slots when the server closes the response
+    def __init__(self, content, releases):
+        self.content = iter(content)
+        self.releases = releases
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.content)
+
+    def close(self):
+        if hasattr(self.content, 'close'):
+            self.content.close()
+        while self.releases:
+            self.releases.pop()()
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class MainConfig(AppConfig):
     name = 'main'
+
+    def ready(self):
+        from . import audit, snapshots, sync, vendors
+        vendors.connect()
+        snapshots.connect()
+        audit.connect()
+        sync.connect()
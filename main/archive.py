@@ -0,0 +1,171 @@
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .fiscal import fiscal_year_range
+from .models import VehicleRecord, ArchivedVehicleRecord, ArchiveYear, ArchiveSummary, SyncDeletion
+
+ARCHIVE_BATCH_SIZE = 2000
+DELETE_BATCH_SIZE = 500
+
+# total_cost is a generated column and is recomputed by the archive table
+RECORD_FIELDS = [f.attname for f in VehicleRecord._meta.concrete_fields if not f.generated]
+
+
+# -----------------------------
+# Moving closed fiscal years
+# -----------------------------
+def archive_fiscal_year(fiscal_year):
+    """Move one fiscal year of VehicleRecord rows into the archive.
+
+    Returns the number of rows moved. Running it again for the same year
+    moves any rows that were added since and rebuilds the year's totals.
+    """
+    start, end = fiscal_year_range(fiscal_year)
+    # Locked, so an edit can't land between a row's copy and its delete
+    live = VehicleRecord.objects.select_for_update().filter(date__gte=start, date__lte=end)
+
+    with transaction.atomic():
+        moved = 0
+        batch = []
+        for row in live.values(*RECORD_FIELDS).iterator(chunk_size=ARCHIVE_BATCH_SIZE):
+            batch.append(ArchivedVehicleRecord(fiscal_year=fiscal_year, **row))
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                moved += move_batch(batch)
+                batch = []
+        moved += move_batch(batch)
+
+        rebuild_summary(fiscal_year)
+        ArchiveYear.objects.update_or_create(
+            fiscal_year=fiscal_year,
+            defaults={
+                'start_date': start,
+                'end_date': end,
+                'record_count': ArchivedVehicleRecord.objects.filter(fiscal_year=fiscal_year).count(),
+            },
+        )
+    return moved
+
+
+def move_batch(batch):
+    ArchivedVehicleRecord.objects.bulk_create(batch)
+    # Sync clients drop archived records like deleted ones
+    SyncDeletion.objects.bulk_create([
+        SyncDeletion(model_name='record', object_id=r.id, user_id=r.user_id, depot_id=r.depot_id)
+        for r in batch
+    ])
+
+    # Exactly the copied ids: archiving is a move, not an edit, so skip
+    # per-row signals. Rows added meanwhile stay for the next run.
+    delete_ids(VehicleRecord, [r.id for r in batch])
+    return len(batch)
+
+
+def delete_ids(model, ids):
+    """Plain DELETE of exactly these rows, sending no signals.
+
+    Callers do any bookkeeping the post_delete receivers would have done.
+    """
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            chunk = ids[i:i + DELETE_BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM {model._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+
+
+def rebuild_summary(fiscal_year):
+    ArchiveSummary.objects.filter(fiscal_year=fiscal_year).delete()
+    rows = (ArchivedVehicleRecord.objects
+            .filter(fiscal_year=fiscal_year)
+            .values('depot', 'driver', 'vehicle_number')
+            .annotate(record_count=Count('id'),
+                      maintenance=Sum('maintenance_cost'),
+                      fuel=Sum('fuel_cost'),
+                      total=Sum('total_cost'))
+            .order_by())
+    ArchiveSummary.objects.bulk_create([
+        ArchiveSummary(
+            fiscal_year=fiscal_year,
+            depot_id=row['depot'],
+            driver_id=row['driver'],
+            vehicle_number=row['vehicle_number'],
+            record_count=row['record_count'],
+            maintenance_cost=row['maintenance'],
+            fuel_cost=row['fuel'],
+            total_cost=row['total'],
+        )
+        for row in rows
+    ])
+
+
+# -----------------------------
+# Reading live + archived data
+# -----------------------------
+def overlapping_years(ad_from, ad_to):
+    return list(ArchiveYear.objects.filter(start_date__lte=ad_to, end_date__gte=ad_from))
+
+
+def archived_records(ad_from, ad_to):
+    """Archived rows in a date range, or an empty queryset if none are archived."""
+    years = overlapping_years(ad_from, ad_to)
+    if not years:
+        return ArchivedVehicleRecord.objects.none()
+    return ArchivedVehicleRecord.objects.filter(
+        fiscal_year__in=[y.fiscal_year for y in years],
+        date__gte=ad_from,
+        date__lte=ad_to,
+    )
+
+
+def with_archive(records, ad_from, ad_to, **filters):
+    """Live records followed by the archived ones for the same range.
+
+    Archived years are always older than live rows, so appending keeps a
+    newest-first ordering intact.
+    """
+    archived = archived_records(ad_from, ad_to).filter(**filters).select_related('driver')
+    return list(records) + list(archived.order_by('-date', '-id'))
+
+
+def archived_summary(group, ad_from, ad_to, **filters):
+    """Summary rows for the archived part of a range, shaped like the live query.
+
+    Whole fiscal years come from ArchiveSummary; partly covered years are
+    aggregated from their archived rows.
+    """
+    years = overlapping_years(ad_from, ad_to)
+    full = [y.fiscal_year for y in years if y.start_date >= ad_from and y.end_date <= ad_to]
+    partial = [y.fiscal_year for y in years if y.fiscal_year not in full]
+
+    rows = []
+    if full:
+        rows += list(ArchiveSummary.objects
+                     .filter(fiscal_year__in=full, **filters)
+                     .values(group)
+                     .annotate(total_maintenance=Sum('maintenance_cost'),
+                               total_fuel=Sum('fuel_cost'),
+                               total_cost=Sum('total_cost'))
+                     .order_by())
+    if partial:
+        rows += list(ArchivedVehicleRecord.objects
+                     .filter(fiscal_year__in=partial, date__gte=ad_from, date__lte=ad_to, **filters)
+                     .values(group)
+                     .annotate(total_maintenance=Sum('maintenance_cost'),
+                               total_fuel=Sum('fuel_cost'),
+                               total_cost=Sum('total_cost'))
+                     .order_by())
+    return rows
+
+
+def merge_summaries(group, *row_lists):
+    merged = {}
+    for rows in row_lists:
+        for row in rows:
+            key = row[group]
+            if key not in merged:
+                merged[key] = dict(row)
+                continue
+            for field in ('total_maintenance', 'total_fuel', 'total_cost'):
+                merged[key][field] = (merged[key][field] or 0) + (row[field] or 0)
+    return list(merged.values())
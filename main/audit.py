@@ -0,0 +1,204 @@
+import threading
+import weakref
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+
+from .models import AuditEntry, Driver, VehicleRecord
+
+# Entries are written in batches, one bulk_create each. Inside a transaction
+# they wait for it to commit (transaction.on_commit) and are dropped with it
+# if it rolls back. Outside one, changes are already committed: entries are
+# buffered per thread inside a batched() block (AuditMiddleware wraps every
+# request in one) and written straight away anywhere else, so scripts and
+# management commands never leave entries behind unless they batch explicitly.
+AUDITED_MODELS = [VehicleRecord, Driver]
+
+# Bookkeeping columns that change on every save and carry no history.
+# Generated columns (total_cost) are left out too: they follow from the
+# logged fields.
+IGNORED_FIELDS = {'updated_at'}
+
+_state = threading.local()
+
+
+def _buffer():
+    if not hasattr(_state, 'entries'):
+        _state.entries = []
+    return _state.entries
+
+
+def _buffer_size():
+    return getattr(settings, 'AUDIT_BUFFER_SIZE', 100)
+
+
+def set_current_user(user):
+    _state.user_id = user.pk if user is not None and user.is_authenticated else None
+
+
+class CommitBatch(list):
+    """Entries logged in one transaction (or savepoint), written when it commits."""
+
+    written = False
+
+    def __call__(self):
+        self.written = True
+        AuditEntry.objects.bulk_create(self, batch_size=_buffer_size())
+
+
+def _commit_batches():
+    if not hasattr(_state, 'commit_batches'):
+        _state.commit_batches = weakref.WeakValueDictionary()
+    return _state.commit_batches
+
+
+def _commit_batch(connection):
+    # The batch waiting on the innermost savepoint (None: the transaction
+    # itself). Only its on_commit callback keeps a batch alive, so once a
+    # rollback discards the callback, the batch drops out of here as well.
+    savepoint = next((sid for sid in reversed(connection.savepoint_ids) if sid is not None), None)
+    key = (connection.alias, savepoint)
+    batch = _commit_batches().get(key)
+    if batch is None or batch.written:
+        batch = CommitBatch()
+        _commit_batches()[key] = batch
+        transaction.on_commit(batch, using=connection.alias)
+    return batch
+
+
+def log(model, object_id, action, changes):
+    now = timezone.now()
+    entry = AuditEntry(
+        month=now.year * 100 + now.month,
+        created_at=now,
+        user_id=getattr(_state, 'user_id', None),
+        model_name=model._meta.model_name,
+        object_id=object_id,
+        action=action,
+        changes=changes,
+    )
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        _commit_batch(connection).append(entry)
+    elif getattr(_state, 'batching', 0):
+        _buffer().append(entry)
+        if len(_buffer()) >= _buffer_size():
+            flush()
+    else:
+        entry.save()
+
+
+def flush():
+    entries = _buffer()
+    if entries:
+        AuditEntry.objects.bulk_create(entries)
+        entries.clear()
+
+
+@contextmanager
+def batched():
+    """Buffer entries logged outside transactions and write them when the block ends."""
+    _state.batching = getattr(_state, 'batching', 0) + 1
+    try:
+        yield
+    finally:
+        _state.batching -= 1
+        if not _state.batching:
+            flush()
+
+
+def history(model, object_id):
+    return AuditEntry.objects.filter(model_name=model._meta.model_name, object_id=object_id)
+
+
+# -----------------------------
+# Change capture
+# -----------------------------
+# Updates are diffed against the stored row, read once when the row is
+# saved. Loading rows (reports, exports) costs nothing extra.
+def tracked_fields(model):
+    return [f.attname for f in model._meta.concrete_fields
+            if not f.primary_key and not f.generated and f.attname not in IGNORED_FIELDS]
+
+
+def _field_values(instance):
+    # Only read what is already loaded, so deferred fields never hit the DB
+    loaded = instance.__dict__
+    return {name: loaded[name] for name in tracked_fields(type(instance)) if name in loaded}
+
+
+def previous_values(instance):
+    """The stored values of a row that is being saved ({} for a new row).
+
+    Meant for pre_save receivers. The row is read by whichever receiver
+    asks first and shared with the others until the save is logged.
+    """
+    if instance._state.adding or instance.pk is None:
+        return {}
+    if '_audit_previous' not in instance.__dict__:
+        row = (type(instance)._base_manager.filter(pk=instance.pk)
+               .values(*tracked_fields(type(instance))).first())
+        instance._audit_previous = row or {}
+    return instance._audit_previous
+
+
+def load_previous(sender, instance, raw=False, **kwargs):
+    # Must happen before the UPDATE; fixtures (raw) are not audited
+    if not raw:
+        previous_values(instance)
+
+
+def record_save(sender, instance, created, **kwargs):
+    current = _field_values(instance)
+    before = instance.__dict__.pop('_audit_previous', {})
+    if created:
+        changes = {k: [None, v] for k, v in current.items()}
+    else:
+        changes = {
+            k: [before[k], v] for k, v in current.items()
+            if k in before and before[k] != v
+        }
+    if changes:
+        log(sender, instance.pk, 'create' if created else 'update', changes)
+
+
+def record_bulk_create(instances):
+    # bulk_create() sends no post_save. Backends that don't return new ids
+    # (MySQL) leave pk unset, and those rows can't be logged by id.
+    for instance in instances:
+        if instance.pk is not None:
+            record_save(type(instance), instance, created=True)
+
+
+def record_delete(sender, instance, **kwargs):
+    log(sender, instance.pk, 'delete', {k: [v, None] for k, v in _field_values(instance).items()})
+
+
+def record_bulk_delete(model, rows):
+    # Set-based deletes send no post_delete; rows are values() of the
+    # deleted rows' id and tracked_fields()
+    for row in rows:
+        log(model, row['id'], 'delete', {k: [v, None] for k, v in row.items() if k != 'id'})
+
+
+def connect():
+    for model in AUDITED_MODELS:
+        pre_save.connect(load_previous, sender=model, dispatch_uid=f'audit_presave_{model._meta.model_name}')
+        post_save.connect(record_save, sender=model, dispatch_uid=f'audit_save_{model._meta.model_name}')
+        post_delete.connect(record_delete, sender=model, dispatch_uid=f'audit_delete_{model._meta.model_name}')
+
+
+class AuditMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        set_current_user(getattr(request, 'user', None))
+        try:
+            with batched():
+                return self.get_response(request)
+        finally:
+            set_current_user(None)
@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import audit
+from .archive import delete_ids
+from .depots import record_depot
+from .models import SyncDeletion
+from .snapshots import mark_stale
+from .vendors import resolve_vendors
+
+# Bulk actions run as one UPDATE/DELETE over the selected queryset
+BULK_ACTIONS = [
+    ('driver', 'Reassign Driver'),
+    ('paid_to_company', 'Change Paid To'),
+    ('vehicle_type', 'Change Vehicle Type'),
+    ('delete', 'Delete'),
+]
+
+
+def apply_bulk_action(records, action, value=None, user=None):
+    """Apply one bulk action to a VehicleRecord queryset in a single transaction.
+
+    Returns the number of affected rows.
+    """
+    with transaction.atomic():
+        if action == 'delete':
+            return bulk_delete(records)
+        changes = {action: value}
+        if action == 'paid_to_company':
+            changes['vendor'] = resolve_vendors([value]).get(value)
+        if action == 'driver' and user is not None and user.is_superuser:
+            # Superusers' records go with the driver's depot, as in edit_record
+            changes['depot'] = record_depot(user, value)
+        return bulk_update_fields(records, changes)
+
+
+def bulk_update_fields(records, changes):
+    # update() sends no signals, so read the old values for the audit log
+    before = list(records.values('id', 'date', *changes))
+
+    # total_cost is generated by the database; auto_now isn't applied by
+    # update() and sync clients page on updated_at
+    updated = records.update(**changes, updated_at=timezone.now())
+
+    meta = records.model._meta
+    new = {name: getattr(value, 'pk', value) for name, value in changes.items()}
+    for row in before:
+        diff = {
+            meta.get_field(name).attname: [row[name], value]
+            for name, value in new.items() if row[name] != value
+        }
+        if diff:
+            audit.log(records.model, row['id'], 'update', diff)
+
+    if 'depot' in changes:
+        # is_fresh() only sees the rows still in a snapshot's depot, so the
+        # depots they left are marked here
+        dates = {row['date'] for row in before}
+        depot_ids = {row['depot'] for row in before}
+        transaction.on_commit(lambda: mark_stale(dates, depot_ids))
+    return updated
+
+
+def bulk_delete(records):
+    # queryset.delete() goes row by row while post_delete receivers are
+    # connected, and each of them writes or queues its own query per row.
+    # Delete by id instead and do their bookkeeping once for the whole set.
+    model = records.model
+    rows = list(records.values('id', *audit.tracked_fields(model)))
+    if not rows:
+        return 0
+
+    delete_ids(model, [row['id'] for row in rows])
+    audit.record_bulk_delete(model, rows)
+    # Sync clients drop their offline copies (see main.sync)
+    SyncDeletion.objects.bulk_create([
+        SyncDeletion(model_name='record', object_id=row['id'], user_id=row['user_id'], depot_id=row['depot_id'])
+        for row in rows
+    ])
+    dates = {row['date'] for row in rows}
+    depot_ids = {row['depot_id'] for row in rows}
+    transaction.on_commit(lambda: mark_stale(dates, depot_ids))
+    return len(rows)
@@ -0,0 +1,281 @@
+import datetime
+import itertools
+import json
+import os
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .fiscal import bs_string
+from .models import ArchivedVehicleRecord, Depot, Driver, Vendor, VehicleRecord
+
+# Columnar snapshots of vehicle records, live and archived, joined with
+# Depot, Driver and Vendor for offline analytics. A snapshot is a directory
+# of part files plus a manifest: a full export writes one part with every
+# record, and each append writes one more part holding only the rows
+# changed since the previous export. Readers load the parts the manifest
+# lists and keep the last row per id; deleted records drop out at the next
+# full export. An append after a change to the columns (SCHEMA_VERSION)
+# writes a full export instead, so parts never mix schemas.
+#
+# Records copy columns from their depot, driver and vendor. The manifest
+# keeps the values each export saw, so an append also re-exports the
+# records of any depot, driver or vendor renamed since, without touching
+# the records themselves.
+#
+# updated_at is set when a row is saved, not when its transaction commits,
+# so a bill committed just after an export's read can carry an earlier time
+# than the export. Appends therefore start APPEND_LAG before the previous
+# export (as main.sync does for its cursors); the rows of that window are
+# exported again, which readers already handle by keeping the last row.
+#
+# Part files are never overwritten: a full export writes a new part, swaps
+# the manifest, and only then deletes the parts the old manifest listed, so
+# a reader or a crash always finds the manifest's parts on disk.
+#
+# Arrow IPC parts are written uncompressed so they can be memory-mapped
+# (pyarrow.memory_map + pyarrow.ipc.open_file) and read without copying.
+SNAPSHOT_BATCH_SIZE = 10000
+APPEND_LAG = datetime.timedelta(minutes=5)
+
+# Bump whenever COLUMNS, BS_COLUMNS, snapshot_schema(), the exported rows or
+# the manifest change.
+SCHEMA_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+# (output column, queryset field)
+COLUMNS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('vehicle_number', 'vehicle_number'),
+    ('vehicle_type', 'vehicle_type'),
+    ('depot_id', 'depot_id'),
+    ('depot_code', 'depot__code'),
+    ('maintenance_cost', 'maintenance_cost'),
+    ('fuel_cost', 'fuel_cost'),
+    ('total_cost', 'total_cost'),
+    ('distance_traveled', 'distance_traveled'),
+    ('driver_id', 'driver_id'),
+    ('driver_code', 'driver__driver_id'),
+    ('driver_name', 'driver__name'),
+    ('vendor_id', 'vendor_id'),
+    ('vendor_name', 'vendor__name'),
+    ('paid_to_company', 'paid_to_company'),
+    ('bill_number', 'bill_number'),
+    ('bill_date', 'bill_date'),
+    ('reason_for_maintenance', 'reason_for_maintenance'),
+    ('updated_at', 'updated_at'),
+]
+
+BS_COLUMNS = [('date_bs', 'date'), ('bill_date_bs', 'bill_date')]
+
+# Columns copied from related rows: (model, record field, its columns)
+RELATED_COLUMNS = [
+    (Depot, 'depot', ['code']),
+    (Driver, 'driver', ['driver_id', 'name']),
+    (Vendor, 'vendor', ['name']),
+]
+
+
+def import_pyarrow():
+    # Only the export needs pyarrow, so the web workers never import it
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Columnar snapshots need pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def snapshot_schema(pa):
+    money = pa.decimal128(10, 2)
+    types = {
+        'id': pa.int64(),
+        'date': pa.date32(),
+        'vehicle_number': pa.string(),
+        # Plain strings, not dictionaries: every batch would carry its own
+        # dictionary, and Arrow IPC files cannot replace one mid-file.
+        # Parquet dictionary-encodes these columns on its own.
+        'vehicle_type': pa.string(),
+        'depot_id': pa.int64(),
+        'depot_code': pa.string(),
+        'maintenance_cost': money,
+        'fuel_cost': money,
+        'total_cost': money,
+        'distance_traveled': money,
+        'driver_id': pa.int64(),
+        'driver_code': pa.string(),
+        'driver_name': pa.string(),
+        'vendor_id': pa.int64(),
+        'vendor_name': pa.string(),
+        'paid_to_company': pa.string(),
+        'bill_number': pa.string(),
+        'bill_date': pa.date32(),
+        'reason_for_maintenance': pa.string(),
+        'updated_at': pa.timestamp('us', tz='UTC'),
+        'date_bs': pa.string(),
+        'bill_date_bs': pa.string(),
+    }
+    return pa.schema([(name, types[name]) for name, _ in COLUMNS + BS_COLUMNS])
+
+
+def record_batches(pa, schema, queryset, batch_size=SNAPSHOT_BATCH_SIZE):
+    """Stream the queryset as Arrow record batches of at most batch_size rows."""
+    fields = [field for _, field in COLUMNS]
+    date_index = {field: fields.index(field) for _, field in BS_COLUMNS}
+    columns = [[] for _ in schema]
+
+    def flush():
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        )
+        for values in columns:
+            values.clear()
+        return batch
+
+    for row in keyset_rows(queryset, fields, batch_size):
+        for values, value in zip(columns, row):
+            values.append(value)
+        for offset, (_, field) in enumerate(BS_COLUMNS):
+            columns[len(COLUMNS) + offset].append(bs_string(row[date_index[field]]))
+        if len(columns[0]) >= batch_size:
+            yield flush()
+    if columns[0]:
+        yield flush()
+
+
+def keyset_rows(queryset, fields, batch_size):
+    # Pages by id instead of iterator(): mysqlclient has no server-side
+    # cursors and would buffer the whole result, while each page here is a
+    # short query on the primary key.
+    id_index = fields.index('id')
+    last_id = None
+    while True:
+        page = queryset.order_by('id')
+        if last_id is not None:
+            page = page.filter(id__gt=last_id)
+        rows = list(page.values_list(*fields)[:batch_size])
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][id_index]
+
+
+def write_part(pa, path, schema, batches, fmt):
+    """Write batches to path (atomically, via a temporary file); returns the row count."""
+    tmp = path + '.tmp'
+    rows = 0
+    try:
+        if fmt == 'parquet':
+            writer = pa.parquet.ParquetWriter(tmp, schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_file(tmp, schema)
+        try:
+            for batch in batches:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        finally:
+            writer.close()
+        os.replace(tmp, path)
+    finally:
+        # Only left behind when the write failed
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
+
+
+def related_values():
+    """The related columns as they are now: {record field: {id: [values]}}, with JSON keys."""
+    return {
+        field: {str(pk): list(values) for pk, *values in model.objects.values_list('pk', *columns)}
+        for model, field, columns in RELATED_COLUMNS
+    }
+
+
+def renamed_since(exported, current):
+    """Records whose depot, driver or vendor changed its columns since `exported` was taken."""
+    renamed = Q(pk__in=[])
+    for field, values in current.items():
+        old = exported.get(field, {})
+        changed = [int(pk) for pk, row in values.items() if pk in old and old[pk] != row]
+        if changed:
+            renamed |= Q(**{f'{field}_id__in': changed})
+    return renamed
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def export_snapshot(directory, fmt='arrow', append=False, batch_size=SNAPSHOT_BATCH_SIZE):
+    """Write a full snapshot, or with append=True a part with the rows changed since the last one.
+
+    Returns the manifest entry of the part that was written (None if an
+    append found nothing to export). Its "mode" is "full" when an append
+    had to start over because the schema changed.
+    """
+    pa = import_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    if append:
+        if manifest is None:
+            raise ValueError(f"No snapshot in {directory} to append to; run a full export first.")
+        if manifest['format'] != fmt:
+            raise ValueError(f"The snapshot in {directory} is {manifest['format']}, not {fmt}.")
+        if manifest.get('schema_version') != SCHEMA_VERSION:
+            append = False
+
+    # Taken before reading, so rows saved or renamed during the export go
+    # into the next part too
+    exported_at = timezone.now()
+    related = related_values()
+    sources = [VehicleRecord.objects.all(), ArchivedVehicleRecord.objects.all()]
+    old_parts = []
+    if append:
+        since = datetime.datetime.fromisoformat(manifest['changed_since'])
+        changed = Q(updated_at__gt=since) | renamed_since(manifest['related'], related)
+        sources = [records.filter(changed) for records in sources]
+    else:
+        old_parts = (manifest or {}).get('parts', [])
+        manifest = {'format': fmt, 'schema_version': SCHEMA_VERSION, 'parts': [],
+                    'next_part': manifest['next_part'] if manifest else 0}
+
+    schema = snapshot_schema(pa)
+    number = manifest['next_part']
+    name = f"part-{number:05d}{FORMATS[fmt]}"
+    batches = itertools.chain.from_iterable(
+        record_batches(pa, schema, records, batch_size) for records in sources)
+    rows = write_part(pa, os.path.join(directory, name), schema, batches, fmt)
+
+    part = None
+    if rows or not append:
+        part = {'file': name, 'rows': rows, 'mode': 'append' if append else 'full',
+                'exported_at': exported_at.isoformat()}
+        manifest['parts'].append(part)
+        manifest['next_part'] = number + 1
+    else:
+        os.remove(os.path.join(directory, name))
+    manifest['exported_at'] = exported_at.isoformat()
+    manifest['changed_since'] = (exported_at - APPEND_LAG).isoformat()
+    manifest['related'] = related
+
+    tmp = os.path.join(directory, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    # Only now that nothing points at them
+    for old in old_parts:
+        try:
+            os.remove(os.path.join(directory, old['file']))
+        except FileNotFoundError:
+            pass
+    return part
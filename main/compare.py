@@ -0,0 +1,67 @@
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Abs, Coalesce
+
+from .archive import overlapping_years
+from .fiscal import in_bs_calendar, previous_period, same_period_last_year
+from .models import VehicleRecord, ArchivedVehicleRecord
+
+COMPARE_GROUPS = {
+    'driver': 'driver__name',
+    'vehicle': 'vehicle_number',
+    'depot': 'depot__name',
+}
+
+COMPARE_MODES = [
+    ('previous', 'Previous Period'),
+    ('last_year', 'Same Period Last Fiscal Year'),
+]
+
+
+def earlier_period(ad_from, ad_to, compare):
+    """The period a comparison is made against, or None when it falls outside the BS calendar."""
+    try:
+        if compare == 'last_year':
+            prev_from, prev_to = same_period_last_year(ad_from, ad_to)
+        else:
+            prev_from, prev_to = previous_period(ad_from, ad_to)
+    except ValueError:
+        return None
+    return (prev_from, prev_to) if in_bs_calendar(prev_from) else None
+
+
+def compare_query(model, group, current, previous, **filters):
+    """Both periods aggregated in one pass with conditional sums, biggest movers first."""
+    in_current = Q(date__gte=current[0], date__lte=current[1])
+    in_previous = Q(date__gte=previous[0], date__lte=previous[1])
+    zero = Value(0, output_field=model._meta.get_field('total_cost').output_field)
+
+    return (model.objects
+            .filter(in_current | in_previous, **filters)
+            .values(group)
+            .annotate(current_total=Coalesce(Sum('total_cost', filter=in_current), zero),
+                      previous_total=Coalesce(Sum('total_cost', filter=in_previous), zero),
+                      current_count=Count('id', filter=in_current),
+                      previous_count=Count('id', filter=in_previous))
+            .annotate(delta=F('current_total') - F('previous_total'))
+            .order_by(Abs('delta').desc(), group))
+
+
+def compare_periods(group_key, current, previous, **filters):
+    group = COMPARE_GROUPS[group_key]
+    rows = list(compare_query(VehicleRecord, group, current, previous, **filters))
+
+    # Either period can reach back into archived fiscal years
+    if overlapping_years(min(current[0], previous[0]), max(current[1], previous[1])):
+        merged = {row[group]: row for row in rows}
+        for row in compare_query(ArchivedVehicleRecord, group, current, previous, **filters):
+            if row[group] not in merged:
+                merged[row[group]] = row
+                continue
+            for field in ('current_total', 'previous_total', 'current_count', 'previous_count', 'delta'):
+                merged[row[group]][field] += row[field]
+        rows = sorted(merged.values(), key=lambda r: (-abs(r['delta']), r[group] or ''))
+
+    for row in rows:
+        row['group'] = row[group]
+        row['delta_pct'] = (row['delta'] / row['previous_total'] * 100) if row['previous_total'] else None
+    return rows
@@ -0,0 +1,88 @@
+from functools import wraps
+
+from django.conf import settings
+from django.shortcuts import render
+
+from .models import Depot, DepotMembership, user_depot
+
+# Depot tenancy. Every user works in one depot (DepotMembership) and the
+# views only read rows through DepotQuerySet.for_user(), so nobody sees
+# another depot's drivers or bills. Depot admins manage and report on
+# their whole depot; superusers see all depots and can narrow reports
+# down to one with ?depot=<id>.
+
+
+def membership(user):
+    try:
+        return user.depot_membership
+    except (DepotMembership.DoesNotExist, AttributeError):
+        return None
+
+
+def is_depot_admin(user):
+    """Superusers, and members flagged as admins of their depot."""
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    member = membership(user)
+    return bool(member and member.is_admin)
+
+
+def join_default_depot(user):
+    """Make a new sign-up a member of settings.DEFAULT_DEPOT, if there is one.
+
+    Without it, an administrator assigns the depot before the user can enter bills.
+    """
+    code = getattr(settings, 'DEFAULT_DEPOT', None)
+    depot = Depot.objects.filter(code=code).first() if code else None
+    if depot is not None:
+        DepotMembership.objects.get_or_create(user=user, defaults={'depot': depot})
+    return depot
+
+
+def record_depot(user, driver=None):
+    """The depot a record entered by the user belongs to.
+
+    Superusers have no depot of their own, so their records go with the driver's.
+    """
+    if user.is_superuser:
+        return driver.depot if driver is not None else None
+    return user_depot(user)
+
+
+def depot_required(view):
+    # Bill entry needs a depot; users still waiting for one get told so
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_superuser and user_depot(request.user) is None:
+            return render(request, 'main/no_depot.html', status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def report_filters(request):
+    """Record filters that limit a report to the depot(s) the user may see.
+
+    An empty dict is a cross-depot report, only available to superusers.
+    """
+    if not request.user.is_superuser:
+        return {'depot': user_depot(request.user)}
+    depot_id = request.GET.get('depot')
+    if depot_id and depot_id.isdigit():
+        return {'depot_id': int(depot_id)}
+    return {}
+
+
+def depot_context(request):
+    # Template context processor: sidebar permissions and the report depot picker
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    depot_id = request.GET.get('depot', '')
+    return {
+        'is_depot_admin': is_depot_admin(user),
+        'user_depot': user_depot(user),
+        'depots': Depot.objects.order_by('name') if user.is_superuser else Depot.objects.none(),
+        'selected_depot': int(depot_id) if depot_id.isdigit() else None,
+    }
@@ -0,0 +1,80 @@
+import datetime
+from functools import lru_cache
+
+from nepali_datetime import date as nepali_date
+
+# Nepal's fiscal year runs from 1 Shrawan (month 4) to the end of Ashadh.
+# A fiscal year is identified by the BS year it starts in: 2080 = 2080/81.
+FISCAL_YEAR_START_MONTH = 4
+
+
+def fiscal_year_of(ad_date):
+    bs = nepali_date.from_datetime_date(ad_date)
+    return bs.year if bs.month >= FISCAL_YEAR_START_MONTH else bs.year - 1
+
+
+def fiscal_year_range(fiscal_year):
+    """Return the first and last AD dates of a fiscal year."""
+    start = nepali_date(fiscal_year, FISCAL_YEAR_START_MONTH, 1).to_datetime_date()
+    end = nepali_date(fiscal_year + 1, FISCAL_YEAR_START_MONTH, 1).to_datetime_date()
+    return start, end - datetime.timedelta(days=1)
+
+
+@lru_cache(maxsize=4096)
+def bs_string(ad_date):
+    """An AD date as a BS 'YYYY-MM-DD' string (None for None).
+
+    Bills cluster on few dates, so the conversion is cached.
+    """
+    return nepali_date.from_datetime_date(ad_date).strftime('%Y-%m-%d') if ad_date else None
+
+
+def bs_string_to_ad(bs_str):
+    """A BS 'YYYY-MM-DD' string as an AD date, or None when it isn't one."""
+    try:
+        y, m, d = map(int, bs_str.split('-'))
+        return nepali_date(y, m, d).to_datetime_date()
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def current_fiscal_year():
+    return fiscal_year_of(nepali_date.today().to_datetime_date())
+
+
+def in_bs_calendar(ad_date):
+    # nepali_datetime only knows BS 1975..2100
+    return nepali_date.min.to_datetime_date() <= ad_date <= nepali_date.max.to_datetime_date()
+
+
+def bs_shift_years(ad_date, years):
+    """Same BS day `years` years earlier/later, clamped to the end of a shorter month.
+
+    Raises ValueError when the shifted year is outside the BS calendar.
+    """
+    bs = nepali_date.from_datetime_date(ad_date)
+    year = bs.year + years
+    if not nepali_date.min.year <= year <= nepali_date.max.year:
+        raise ValueError(f"BS year {year} is outside the supported calendar")
+    day = bs.day
+    while True:
+        try:
+            return nepali_date(year, bs.month, day).to_datetime_date()
+        except ValueError:
+            # Every BS month has at least 29 days
+            if day <= 29:
+                raise
+            day -= 1
+
+
+def previous_period(ad_from, ad_to):
+    """The period of the same length ending the day before ad_from.
+
+    It may start before the BS calendar does; check it with in_bs_calendar().
+    """
+    prev_to = ad_from - datetime.timedelta(days=1)
+    return prev_to - (ad_to - ad_from), prev_to
+
+
+def same_period_last_year(ad_from, ad_to):
+    return bs_shift_years(ad_from, -1), bs_shift_years(ad_to, -1)
@@ -1,5 +1,8 @@
 from django import forms
-from .models import VehicleRecord, Driver
+from django.urls import reverse_lazy
+from nepali_datetime import date as nepali_date
+from .models import VehicleRecord, Driver, VEHICLES_TYPE_CHOICES
+from .bulk import BULK_ACTIONS
 
 class VehicleRecordForm(forms.ModelForm):
     # driver dropdown
@@ -62,7 +65,12 @@ class VehicleRecordForm(forms.ModelForm):
                 'data-live-search': 'true'
             }),
             'distance_traveled': forms.NumberInput(attrs={'class': 'form-control'}),
-            'paid_to_company': forms.TextInput(attrs={'class': 'form-control'}),
+            # Free text with vendor suggestions; see vendor-suggest in base.html
+            'paid_to_company': forms.TextInput(attrs={
+                'class': 'form-control',
+                'autocomplete': 'off',
+                'data-vendor-suggest': reverse_lazy('vendor_suggest'),
+            }),
             'bill_number': forms.TextInput(attrs={'class': 'form-control'}),
             'reason_for_maintenance': forms.TextInput(attrs={'class': 'form-control'}),
         }
@@ -87,12 +95,91 @@ class VehicleRecordForm(forms.ModelForm):
             )
 
         return cleaned_data
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only drivers of the user's own depot can be picked
+        if user is not None:
+            self.fields['driver'].queryset = Driver.objects.for_user(user).order_by('name')
+
+
+# One row of the batch entry form. The entry date is always today, and
+# the bill date is typed in BS like on the single record form.
+class BatchVehicleRecordForm(VehicleRecordForm):
+    bill_date = forms.CharField(
+        widget=forms.TextInput(attrs={'class': 'form-control bill-nepali'})
+    )
+
+    class Meta(VehicleRecordForm.Meta):
+        fields = [f for f in VehicleRecordForm.Meta.fields if f != 'date']
+
+    def clean_bill_date(self):
+        try:
+            y, m, d = map(int, self.cleaned_data['bill_date'].split('-'))
+            return nepali_date(y, m, d).to_datetime_date()
+        except ValueError:
+            raise forms.ValidationError("Enter a valid BS date (YYYY-MM-DD).")
+
+
 # Admin form for adding drivers
 class DriverForm(forms.ModelForm):
     class Meta:
         model = Driver
-        fields = ['name', 'driver_id']
+        fields = ['name', 'driver_id', 'depot']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter driver name'}),
             'driver_id': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter driver ID'}),
+            'depot': forms.Select(attrs={'class': 'form-control'}),
         }
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Superusers pick the depot; depot admins add drivers to their own
+        if user is None or not user.is_superuser:
+            del self.fields['depot']
+        else:
+            self.fields['depot'].required = True
+
+
+# Admin form for bulk edit / delete of selected records
+class BulkRecordForm(forms.Form):
+    action = forms.ChoiceField(
+        choices=BULK_ACTIONS,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    driver = forms.ModelChoiceField(
+        queryset=Driver.objects.all(),
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'form-control selectpicker',
+            'data-live-search': 'true'
+        })
+    )
+    paid_to_company = forms.CharField(
+        max_length=50,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    vehicle_type = forms.ChoiceField(
+        choices=[('', '---------')] + VEHICLES_TYPE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+
+        # The field named after the action holds the new value
+        if action and action != 'delete' and not cleaned_data.get(action):
+            self.add_error(action, "This field is required for the selected action.")
+
+        return cleaned_data
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            self.fields['driver'].queryset = Driver.objects.for_user(user).order_by('name')
+
+    def value(self):
+        return self.cleaned_data.get(self.cleaned_data['action'])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from main.archive import archive_fiscal_year
+from main.fiscal import current_fiscal_year, fiscal_year_of
+from main.models import VehicleRecord
+
+
+class Command(BaseCommand):
+    help = "Move closed fiscal years of vehicle records into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', type=int,
+                            help="Last fiscal year to archive (BS start year, e.g. 2080 for 2080/81). "
+                                 "Defaults to the most recently closed year.")
+        parser.add_argument('--keep', type=int, default=0,
+                            help="Number of closed fiscal years to keep live.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        current = current_fiscal_year()
+        through = options['through'] or current - 1 - options['keep']
+        if through >= current:
+            raise CommandError(f"Fiscal year {current} is still open and cannot be archived.")
+
+        oldest = VehicleRecord.objects.aggregate(oldest=Min('date'))['oldest']
+        if oldest is None:
+            self.stdout.write("No records to archive.")
+            return
+
+        for fiscal_year in range(fiscal_year_of(oldest), through + 1):
+            if options['dry_run']:
+                self.stdout.write(f"Would archive FY {fiscal_year}")
+                continue
+            moved = archive_fiscal_year(fiscal_year)
+            self.stdout.write(f"FY {fiscal_year}: archived {moved} records.")
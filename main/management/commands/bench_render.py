@@ -0,0 +1,145 @@
+import datetime
+import json
+import statistics
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import get_template
+from nepali_datetime import date as nepali_date
+
+from main.models import VehicleRecord, Driver
+from main.tables import record_rows
+
+# The per-row template loop of My Records before main.tables, unchanged,
+# kept here as the baseline.
+TEMPLATE_ROWS = """{% for record in user_records %}
+    <tr>
+        <td>
+            {{ record.bs_date.year }}-
+            {{ record.bs_date.month|stringformat:"02d" }}-
+            {{ record.bs_date.day|stringformat:"02d" }}
+        </td>
+        <td>{{ record.vehicle_number }}</td>
+        <td>{{ record.vehicle_type }}</td>
+        <td>{{ record.maintenance_cost|floatformat:2 }}</td>
+        <td>{{ record.fuel_cost|floatformat:2 }}</td>
+        <td>{{ record.total_cost|floatformat:2 }}</td>
+        <td>{{ record.distance_traveled|floatformat:0 }} Km</td>
+        <td>{{ record.driver.name }}</td>
+        <td>{{ record.paid_to_company }}</td>
+        <td>{{ record.bill_number }}</td>
+        <td>
+            {{ record.bs_bill_date.year }}-
+            {{ record.bs_bill_date.month|stringformat:"02d" }}-
+            {{ record.bs_bill_date.day|stringformat:"02d" }}
+        </td>
+        <td>{{ record.reason_for_maintenance }}</td>
+
+        {% if user.is_superuser %}
+        <td>
+            <a href="{% url 'edit_record' record.id %}"
+               class="btn btn-sm btn-warning">
+                Edit
+            </a>
+        </td>
+        {% endif %}
+    </tr>
+{% endfor %}"""
+
+
+def sample_records(count):
+    """Unsaved records spread over a year, so nothing touches the database."""
+    drivers = [Driver(id=i, driver_id=f"D{i}", name=f"Driver {i}") for i in range(1, 21)]
+    start = datetime.date(2024, 7, 16)
+    records = []
+    for i in range(count):
+        record = VehicleRecord(
+            id=i + 1,
+            date=start + datetime.timedelta(days=i % 365),
+            vehicle_number=f"BA {i % 50} KHA {1000 + i % 50}",
+            vehicle_type='Diesel' if i % 3 else 'Petrol',
+            maintenance_cost=Decimal(i % 700),
+            fuel_cost=Decimal('1520.50'),
+            distance_traveled=Decimal('42.50'),
+            driver=drivers[i % len(drivers)],
+            paid_to_company='Sipradi Trading Pvt. Ltd.',
+            bill_number=f"INV-{i}",
+            bill_date=start + datetime.timedelta(days=i % 365),
+            reason_for_maintenance='Brake pads & oil' if i % 700 else '',
+        )
+        # Generated column, normally read back from the database
+        record.total_cost = record.maintenance_cost + record.fuel_cost
+        records.append(record)
+    return records
+
+
+def timed(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+class Command(BaseCommand):
+    help = ("Benchmark rendering of the record tables: the per-row template loop versus "
+            "main.tables.record_rows, and the full My Records page.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        engine = engines['django']
+        runs = options['runs']
+
+        # Parsing a page (with base.html) per request is what Django's default cached loader saves
+        source = get_template('main/my_records.html').template.source
+        results = {
+            'template_compile_ms': timed(lambda: engine.from_string(source), runs),
+            'template_cached_ms': timed(lambda: get_template('main/my_records.html'), runs),
+            'tables': [],
+        }
+
+        baseline = engine.from_string(TEMPLATE_ROWS)
+        page = get_template('main/my_records.html')
+        for count in options['rows']:
+            records = sample_records(count)
+
+            def template_loop():
+                # The views converted both dates per row for the template
+                for r in records:
+                    r.bs_date = nepali_date.from_datetime_date(r.date)
+                    r.bs_bill_date = nepali_date.from_datetime_date(r.bill_date)
+                baseline.render({'user_records': records, 'user': SimpleNamespace(is_superuser=True)})
+
+            results['tables'].append({
+                'rows': count,
+                'template_loop_ms': timed(template_loop, runs),
+                'record_rows_ms': timed(lambda: record_rows(records, editable=True), runs),
+                'my_records_page_ms': timed(lambda: page.render({
+                    'user_records': records,
+                    'rows': record_rows(records, editable=True),
+                    'is_depot_admin': True,
+                    'from_date': '2081-04-01',
+                    'to_date': '2082-03-31',
+                }), runs),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"my_records.html: compile {results['template_compile_ms']:.2f} ms, "
+                          f"cached load {results['template_cached_ms']:.3f} ms (median of {runs} runs)")
+        for row in results['tables']:
+            self.stdout.write(f"{row['rows']:>7} rows:")
+            self.stdout.write(f"  template loop:  {row['template_loop_ms']:9.1f} ms")
+            self.stdout.write(f"  record_rows:    {row['record_rows_ms']:9.1f} ms "
+                              f"({row['template_loop_ms'] / row['record_rows_ms']:.1f}x faster)")
+            self.stdout.write(f"  My Records page: {row['my_records_page_ms']:8.1f} ms")
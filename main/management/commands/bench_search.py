@@ -0,0 +1,119 @@
+import datetime
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from main.models import ArchivedVehicleRecord, VehicleRecord
+from main.search import ARCHIVE_RESULTS, search_archive, search_page, search_records
+
+VENDORS = ['Sipradi Trading Pvt. Ltd.', 'Nepal Oil Corporation', 'Sita Motors', 'Araniko Auto Parts',
+           'Bhajuratna Engineering', 'Himalayan Tyres', 'Agni Incorporated', 'Laxmi Service Centre']
+REASONS = ['', '', 'Brake pads', 'Engine oil change', 'Clutch plate', 'Tyre replacement',
+           'Air filter', 'Battery', 'Wheel alignment', 'Annual service']
+
+# Search box inputs from narrow to broad: one bill, one vendor word, a
+# phrase, and a one-letter prefix that matches most of the table
+QUERIES = ['INV-123457', 'araniko', 'engine oil', 'a']
+
+
+def sample_record(model, i, user, start, **fields):
+    day = start + datetime.timedelta(days=i % 365)
+    return model(
+        user=user, date=day, bill_date=day, vehicle_number=f"BA {i % 50} KHA {1000 + i % 50}",
+        vehicle_type='Diesel', maintenance_cost=Decimal(i % 700), fuel_cost=Decimal('1520.50'),
+        paid_to_company=VENDORS[i % len(VENDORS)], bill_number=f"INV-{i}",
+        reason_for_maintenance=REASONS[i % len(REASONS)], **fields)
+
+
+def timed(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+class Command(BaseCommand):
+    help = ("Benchmark bill search (first page with its capped count, and the archived "
+            "matches) on a scratch test database filled with generated bills.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--archived', type=int, default=None,
+                            help="Archived rows (default: same as --rows).")
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        # Never fill the real database: build a throwaway one the way the test runner does
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{results['vendor']}: {results['rows']} live and {results['archived']} archived "
+                          f"rows, loaded in {results['load_s']:.0f} s (median of {options['runs']} runs)")
+        for row in results['queries']:
+            self.stdout.write(f"  {row['query']!r:14} {row['matches']:>8} matches  "
+                              f"first page {row['page_ms']:7.1f} ms  "
+                              f"(ranked and fully counted {row['ranked_page_ms']:7.1f} ms)  "
+                              f"archive {row['archive_ms']:7.1f} ms")
+
+    def run(self, options):
+        rows = options['rows']
+        archived = rows if options['archived'] is None else options['archived']
+        user = User.objects.create_user('bench')
+        start = datetime.date(2024, 7, 16)
+
+        t0 = time.perf_counter()
+        for first in range(0, rows, 5000):
+            VehicleRecord.objects.bulk_create(
+                sample_record(VehicleRecord, i, user, start) for i in range(first, min(first + 5000, rows)))
+        # Archived ids carry on after the live ones, as archive_fiscal_year keeps ids unique
+        for first in range(rows, rows + archived, 5000):
+            ArchivedVehicleRecord.objects.bulk_create(
+                sample_record(ArchivedVehicleRecord, i, user, start.replace(year=2023), fiscal_year=2080)
+                for i in range(first, min(first + 5000, rows + archived)))
+        load_s = time.perf_counter() - t0
+
+        queries = []
+        for query in QUERIES:
+            def first_page():
+                # What the search view does for page 1
+                page = search_page(VehicleRecord.objects.select_related('driver'), query, 1)
+                return list(page)
+
+            def full_count():
+                return search_records(VehicleRecord.objects.all(), query).order_by().count()
+
+            def ranked_page():
+                # Ranking and counting every match, as the page did before COUNT_LIMIT
+                records = search_records(VehicleRecord.objects.select_related('driver'), query)
+                return records.count(), list(records[:50])
+
+            def archive_page():
+                return list(search_archive(ArchivedVehicleRecord.objects.select_related('driver'),
+                                           query)[:ARCHIVE_RESULTS + 1])
+
+            queries.append({
+                'query': query,
+                'matches': full_count(),
+                'page_ms': timed(first_page, options['runs']),
+                'ranked_page_ms': timed(ranked_page, options['runs']),
+                'archive_ms': timed(archive_page, options['runs']),
+            })
+
+        return {'vendor': connection.vendor, 'rows': rows, 'archived': archived,
+                'load_s': load_s, 'queries': queries}
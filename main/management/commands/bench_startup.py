@@ -0,0 +1,86 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Each run happens in a fresh interpreter, the way a restarted worker boots:
+# set up Django, build the WSGI app and serve one request to the login page.
+BOOT_SCRIPT = """
+import io, json, resource, sys, time
+t0 = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+t_boot = time.perf_counter()
+
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': PATH, 'REQUEST_METHOD': 'GET', 'wsgi.input': io.BytesIO()}
+setup_testing_defaults(environ)
+status = []
+b''.join(application(environ, lambda s, h, e=None: status.append(s)))
+t_first = time.perf_counter()
+
+print(json.dumps({
+    'status': status[0],
+    'boot_ms': (t_boot - t0) * 1000,
+    'first_response_ms': (t_first - t0) * 1000,
+    'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure worker cold start: import time, time to first response and RSS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/login/')
+        parser.add_argument('--top', type=int, default=15,
+                            help="Show the slowest imports from a -X importtime run.")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def run_child(self, path, *python_flags):
+        # manage.py has already put DJANGO_SETTINGS_MODULE in the environment
+        return subprocess.run(
+            [sys.executable, *python_flags, '-c', f'PATH = {path!r}\n' + BOOT_SCRIPT],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+
+    def handle(self, *args, **options):
+        runs = [json.loads(self.run_child(options['path']).stdout) for _ in range(options['runs'])]
+
+        # -X importtime lines: "import time: self [us] | cumulative | imported package"
+        imports = []
+        for line in self.run_child(options['path'], '-X', 'importtime').stderr.splitlines():
+            parts = line.split('|')
+            if line.startswith('import time:') and parts[1].strip().isdigit():
+                imports.append((int(parts[1]), parts[2].rstrip()))
+        imports.sort(reverse=True)
+
+        result = {
+            'path': options['path'],
+            'status': runs[0]['status'],
+            'runs': len(runs),
+            'boot_ms': statistics.median(r['boot_ms'] for r in runs),
+            'first_response_ms': statistics.median(r['first_response_ms'] for r in runs),
+            'maxrss_kb': statistics.median(r['maxrss_kb'] for r in runs),
+            'modules': runs[0]['modules'],
+            'slowest_imports': [{'module': name.strip(), 'cumulative_us': us}
+                                for us, name in imports[:options['top']]],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"{result['path']} -> {result['status']} (median of {result['runs']} runs)")
+        self.stdout.write(f"  boot:           {result['boot_ms']:.1f} ms")
+        self.stdout.write(f"  first response: {result['first_response_ms']:.1f} ms")
+        self.stdout.write(f"  max RSS:        {result['maxrss_kb'] / 1024:.1f} MB")
+        self.stdout.write(f"  modules loaded: {result['modules']}")
+        self.stdout.write("Slowest imports (cumulative):")
+        for row in result['slowest_imports']:
+            self.stdout.write(f"  {row['cumulative_us'] / 1000:8.1f} ms  {row['module']}")
@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from main.snapshots import config, refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = ("Precompute the standard summary reports. Builds missing or stale snapshots once, "
+            "or with --loop keeps running: stale snapshots are rebuilt every CHECK_INTERVAL "
+            "seconds and everything is rebuilt daily at BUILD_AT.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild every snapshot, fresh or not.")
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived scheduler.")
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.refresh(options['force'])
+            return
+
+        build_at = datetime.time.fromisoformat(config('BUILD_AT'))
+        # Starting up during the day only builds what is missing or stale
+        last_full_build = timezone.localdate() if timezone.localtime().time() >= build_at else None
+        force = options['force']
+        try:
+            while True:
+                close_old_connections()
+                now = timezone.localtime()
+                due = now.time() >= build_at and last_full_build != now.date()
+                self.refresh(force or due)
+                if due:
+                    last_full_build = now.date()
+                force = False
+                time.sleep(config('CHECK_INTERVAL'))
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
+
+    def refresh(self, force):
+        built = refresh_snapshots(force=force)
+        for snapshot in built:
+            self.stdout.write(f"Built {snapshot.name} by {snapshot.group}: "
+                              f"{snapshot.date_from} to {snapshot.date_to}, {len(snapshot.rows)} rows.")
+        if not built:
+            self.stdout.write("All snapshots are fresh.")
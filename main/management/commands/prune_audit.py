@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import AuditEntry
+
+
+class Command(BaseCommand):
+    help = "Delete audit log months older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=24)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Count back whole months from the current one, e.g. 202410 keep 3 -> 202408
+        index = now.year * 12 + now.month - 1 - (options['keep_months'] - 1)
+        cutoff = (index // 12) * 100 + index % 12 + 1
+
+        deleted, _ = AuditEntry.objects.filter(month__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} audit entries before {cutoff}.")
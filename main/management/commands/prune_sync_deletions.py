@@ -0,0 +1,22 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import SyncDeletion
+from main.sync import SYNC_DELETION_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = "Delete sync deletion tombstones older than the retention period."
+
+    def add_arguments(self, parser):
+        # Pulls only refuse cursors older than SYNC_DELETION_RETENTION_DAYS, so
+        # keeping fewer days can hide deletions from the clients in between
+        parser.add_argument('--keep-days', type=int, default=SYNC_DELETION_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['keep_days'])
+
+        deleted, _ = SyncDeletion.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} sync deletions before {cutoff:%Y-%m-%d %H:%M}.")
@@ -0,0 +1,111 @@
+from django.db import migrations
+
+# The SQL below is frozen as of this migration; later migrations that need
+# the index or its triggers (0010, 0011, 0013, 0014, 0016) use these helpers
+# rather than main.search, so they never change with the app code.
+LIVE = 'main_vehiclerecord'
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+def sqlite_index(table):
+    # Prefix indexes make the short prefixes people type ("a", "inv") cheap
+    return f"""CREATE VIRTUAL TABLE {fts_table(table)} USING fts5(
+        bill_number, paid_to_company, reason_for_maintenance,
+        content='{table}', content_rowid='id', prefix='1 2 3'
+    )"""
+
+
+def sqlite_trigger_names(table):
+    return [f'{fts_table(table)}_ai', f'{fts_table(table)}_ad', f'{fts_table(table)}_au']
+
+
+def sqlite_triggers(table):
+    fts = fts_table(table)
+    return [
+        f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, bill_number, paid_to_company, reason_for_maintenance)
+            VALUES (new.id, new.bill_number, new.paid_to_company, new.reason_for_maintenance);
+        END""",
+        f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, bill_number, paid_to_company, reason_for_maintenance)
+            VALUES ('delete', old.id, old.bill_number, old.paid_to_company, old.reason_for_maintenance);
+        END""",
+        f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF bill_number, paid_to_company, reason_for_maintenance
+            ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, bill_number, paid_to_company, reason_for_maintenance)
+            VALUES ('delete', old.id, old.bill_number, old.paid_to_company, old.reason_for_maintenance);
+            INSERT INTO {fts}(rowid, bill_number, paid_to_company, reason_for_maintenance)
+            VALUES (new.id, new.bill_number, new.paid_to_company, new.reason_for_maintenance);
+        END""",
+    ]
+
+
+def sqlite_rebuild(table):
+    return f"INSERT INTO {fts_table(table)}({fts_table(table)}) VALUES ('rebuild')"
+
+
+def sqlite_create(table):
+    return [
+        sqlite_index(table),
+        *sqlite_triggers(table),
+        # Index the rows that already exist
+        sqlite_rebuild(table),
+    ]
+
+
+def sqlite_drop(table):
+    return [
+        *(f"DROP TRIGGER IF EXISTS {name}" for name in sqlite_trigger_names(table)),
+        f"DROP TABLE IF EXISTS {fts_table(table)}",
+    ]
+
+
+def mysql_create(table, index):
+    return [f"CREATE FULLTEXT INDEX {index} ON {table} (bill_number, paid_to_company, reason_for_maintenance)"]
+
+
+def mysql_drop(table, index):
+    return [f"DROP INDEX {index} ON {table}"]
+
+
+def run_for_vendor(sqlite_sql, mysql_sql):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements = {'sqlite': sqlite_sql, 'mysql': mysql_sql}.get(vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+def restore_search_triggers(schema_editor, tables, rebuild=False):
+    """Reinstall the SQLite search triggers of the given tables, optionally reindexing every row.
+
+    SQLite drops a table's triggers whenever a migration rebuilds it (adding
+    a unique or generated column, dropping one), so those migrations call this.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in tables:
+        for name in sqlite_trigger_names(table):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for sql in sqlite_triggers(table):
+            schema_editor.execute(sql)
+        if rebuild:
+            schema_editor.execute(sqlite_rebuild(table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_alter_driver_id_alter_vehiclerecord_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(sqlite_create(LIVE), mysql_create(LIVE, 'vehiclerecord_search')),
+            run_for_vendor(sqlite_drop(LIVE), mysql_drop(LIVE, 'vehiclerecord_search')),
+        ),
+    ]
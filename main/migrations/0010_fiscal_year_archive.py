@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-19 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('main.migrations.0008_vehiclerecord_search_index')
+
+ARCHIVE = 'main_archivedvehiclerecord'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_auditentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.PositiveIntegerField(unique=True)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedVehicleRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('vehicle_number', models.CharField(max_length=20)),
+                ('vehicle_type', models.CharField(choices=[('Electric', 'Electric'), ('Petrol', 'Petrol'), ('Diesel', 'Diesel')], max_length=10)),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fuel_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_to_company', models.CharField(max_length=50)),
+                ('bill_number', models.CharField(max_length=50)),
+                ('bill_date', models.DateField()),
+                ('distance_traveled', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('reason_for_maintenance', models.CharField(blank=True, max_length=200)),
+                ('fiscal_year', models.PositiveIntegerField()),
+                ('driver', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.driver')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fiscal_year', 'date'], name='archivedrecord_fy_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.PositiveIntegerField()),
+                ('vehicle_number', models.CharField(max_length=20)),
+                ('record_count', models.PositiveIntegerField()),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('fuel_cost', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('driver', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.driver')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fiscal_year', 'driver'], name='archivesummary_fy_driver_idx'), models.Index(fields=['fiscal_year', 'vehicle_number'], name='archivesummary_fy_vehicle_idx')],
+            },
+        ),
+        # Archived bills get a search index of their own instead of being scanned
+        migrations.RunPython(
+            search_index.run_for_vendor(search_index.sqlite_create(ARCHIVE),
+                                        search_index.mysql_create(ARCHIVE, 'archivedrecord_search')),
+            search_index.run_for_vendor(search_index.sqlite_drop(ARCHIVE),
+                                        search_index.mysql_drop(ARCHIVE, 'archivedrecord_search')),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-19 12:30
+
+from importlib import import_module
+
+import django.utils.timezone
+from django.db import migrations, models
+
+search_index = import_module('main.migrations.0008_vehiclerecord_search_index')
+
+SEARCH_TABLES = ['main_vehiclerecord', 'main_archivedvehiclerecord']
+
+
+# SQLite rebuilds both record tables to add the unique client_key column,
+# which drops the search triggers from 0008 and 0010, so they are put back
+# and the indexes are rebuilt afterwards (also after the rebuild on the way back)
+def restore_search_triggers(apps, schema_editor):
+    search_index.restore_search_triggers(schema_editor, SEARCH_TABLES, rebuild=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_fiscal_year_archive'),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='driver',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='vehiclerecord',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclerecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedvehiclerecord',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='archivedvehiclerecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 10:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_sync_client_key_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30)),
+                ('group', models.CharField(max_length=30)),
+                ('date_from', models.DateField()),
+                ('date_to', models.DateField()),
+                ('rows', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('built_at', models.DateTimeField()),
+                ('stale', models.BooleanField(default=False)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'date_from', 'date_to'), name='reportsnapshot_range_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0 on 2026-10-19 11:30
+
+from importlib import import_module
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+search_index = import_module('main.migrations.0008_vehiclerecord_search_index')
+
+RECORD_TABLES = ['main_vehiclerecord', 'main_archivedvehiclerecord']
+
+
+def recompute_totals(apps, schema_editor):
+    # Going back to a plain column: fill it in the way save() used to, and
+    # reinstall the triggers that rebuilding the table dropped again
+    for table in RECORD_TABLES:
+        schema_editor.execute(f"UPDATE {table} SET total_cost = maintenance_cost + fuel_cost")
+    restore_search_triggers(apps, schema_editor)
+
+
+# SQLite rebuilds both record tables to add (or, going back, remove) the
+# generated column, which drops the search triggers from 0008 and 0010, so this
+# migration puts them back. Nothing writes to the tables in between, so the
+# indexes themselves need no rebuild.
+def restore_search_triggers(apps, schema_editor):
+    search_index.restore_search_triggers(schema_editor, RECORD_TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_reportsnapshot'),
+    ]
+
+    # GeneratedField can't be altered into, so the column is dropped and re-added.
+    # The state-only default lets the plain column be re-added on the way back.
+    operations = [
+        # Rows with a stale total (update()/bulk paths that skipped save())
+        # are simply recomputed by the generated column
+        migrations.RunPython(migrations.RunPython.noop, recompute_totals),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='vehiclerecord',
+                name='total_cost',
+                field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            ),
+            migrations.AlterField(
+                model_name='archivedvehiclerecord',
+                name='total_cost',
+                field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            ),
+        ]),
+        migrations.RemoveField(
+            model_name='vehiclerecord',
+            name='total_cost',
+        ),
+        migrations.AddField(
+            model_name='vehiclerecord',
+            name='total_cost',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('maintenance_cost'), '+', models.F('fuel_cost')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.RemoveField(
+            model_name='archivedvehiclerecord',
+            name='total_cost',
+        ),
+        migrations.AddField(
+            model_name='archivedvehiclerecord',
+            name='total_cost',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('maintenance_cost'), '+', models.F('fuel_cost')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-19 13:10
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+search_index = import_module('main.migrations.0008_vehiclerecord_search_index')
+
+SEARCH_TABLES = ['main_vehiclerecord', 'main_archivedvehiclerecord']
+
+
+# Going back, SQLite rebuilds both record tables to drop the vendor column,
+# which drops the search triggers from 0008 and 0010, so they are put back
+# (the indexes themselves are unchanged)
+def restore_search_triggers(apps, schema_editor):
+    search_index.restore_search_triggers(schema_editor, SEARCH_TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_generated_total_cost'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.CreateModel(
+            name='Vendor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VendorAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'vendor aliases',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedvehiclerecord',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.vendor'),
+        ),
+        migrations.AddField(
+            model_name='vehiclerecord',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.vendor'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclerecord',
+            index=models.Index(fields=['vendor', 'date'], name='vehiclerecord_vendor_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='vendoralias',
+            name='vendor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='main.vendor'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 6.0 on 2026-10-19 13:20
+
+import re
+from collections import Counter, defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+# Frozen copy of main.vendors.normalize_vendor as of this migration
+LEGAL_SUFFIXES = {'pvt', 'private', 'ltd', 'limited', 'inc', 'co'}
+
+
+def normalize_vendor(name):
+    words = []
+    initials = ''
+    for word in re.sub(r'[^\w\s]', ' ', name.casefold()).split() + ['']:
+        # Initials written as "S.T.P.L." or "S T P L" become one word
+        if len(word) == 1:
+            initials += word
+            continue
+        if initials:
+            words.append(initials)
+            initials = ''
+        if word:
+            words.append(word)
+    stem = list(words)
+    while stem and stem[-1] in LEGAL_SUFFIXES:
+        stem.pop()
+    return ' '.join(stem or words)[:50]
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_vendors(apps, schema_editor):
+    """Cluster existing paid_to_company spellings by normalized key, one Vendor each.
+
+    Each vendor is named after the spelling used on the most bills.
+    """
+    Vendor = apps.get_model('main', 'Vendor')
+    record_models = [apps.get_model('main', 'VehicleRecord'), apps.get_model('main', 'ArchivedVehicleRecord')]
+
+    clusters = defaultdict(Counter)
+    for model in record_models:
+        for row in model.objects.values('paid_to_company').annotate(bills=Count('id')).order_by():
+            name = row['paid_to_company']
+            # Punctuation-only names have no key and get no vendor
+            if name and normalize_vendor(name):
+                clusters[normalize_vendor(name)][name] += row['bills']
+
+    vendor_ids = {}
+    for key, spellings in clusters.items():
+        vendor, _ = Vendor.objects.get_or_create(
+            key=key, defaults={'name': spellings.most_common(1)[0][0].strip()},
+        )
+        vendor_ids[key] = vendor.id
+
+    # paid_to_company has no index, so instead of one UPDATE per vendor
+    # (a table scan each) the records are walked once by id
+    for model in record_models:
+        last_id = 0
+        while True:
+            rows = list(model.objects.filter(id__gt=last_id, vendor__isnull=True)
+                        .order_by('id').values_list('id', 'paid_to_company')[:BATCH_SIZE])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            records = [
+                model(id=pk, vendor_id=vendor_ids[normalize_vendor(name)])
+                for pk, name in rows if name and normalize_vendor(name)
+            ]
+            model.objects.bulk_update(records, ['vendor'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_vendor'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vendors, migrations.RunPython.noop),
+    ]
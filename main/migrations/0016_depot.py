@@ -0,0 +1,100 @@
+# Generated by Django 6.0 on 2026-10-19 14:05
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+search_index = import_module('main.migrations.0008_vehiclerecord_search_index')
+
+SEARCH_TABLES = ['main_vehiclerecord', 'main_archivedvehiclerecord']
+
+
+# Going back, SQLite rebuilds both record tables to drop the depot column,
+# which drops the search triggers from 0008 and 0010, so they are put back
+# (the indexes themselves are unchanged)
+def restore_search_triggers(apps, schema_editor):
+    search_index.restore_search_triggers(schema_editor, SEARCH_TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_backfill_vendors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.CreateModel(
+            name='Depot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('code', models.CharField(max_length=10, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DepotMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_admin', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedvehiclerecord',
+            name='depot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='main.depot'),
+        ),
+        migrations.AddField(
+            model_name='archivesummary',
+            name='depot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='main.depot'),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='depot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='main.depot'),
+        ),
+        migrations.AddField(
+            model_name='vehiclerecord',
+            name='depot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='main.depot'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedvehiclerecord',
+            index=models.Index(fields=['depot', 'date'], name='archivedrecord_depot_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivesummary',
+            index=models.Index(fields=['depot', 'fiscal_year'], name='archivesummary_depot_fy_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['depot', 'name'], name='driver_depot_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclerecord',
+            index=models.Index(fields=['depot', 'date'], name='vehiclerecord_depot_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclerecord',
+            index=models.Index(fields=['depot', 'vehicle_number', 'date'], name='vehiclerecord_depot_veh_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclerecord',
+            index=models.Index(fields=['depot', 'driver', 'date'], name='vehiclerecord_depot_drv_idx'),
+        ),
+        migrations.AddField(
+            model_name='depotmembership',
+            name='depot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='main.depot'),
+        ),
+        migrations.AddField(
+            model_name='depotmembership',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='depot_membership', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
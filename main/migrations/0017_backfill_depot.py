@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-19 14:06
+
+from django.db import migrations
+
+
+def backfill_depot(apps, schema_editor):
+    """Put existing data into one "Main Depot", so nothing becomes invisible.
+
+    Every regular user becomes a member; staff users become its admins.
+    Nothing is created on an empty database.
+    """
+    Depot = apps.get_model('main', 'Depot')
+    DepotMembership = apps.get_model('main', 'DepotMembership')
+    User = apps.get_model('auth', 'User')
+    models = [apps.get_model('main', name)
+              for name in ('Driver', 'VehicleRecord', 'ArchivedVehicleRecord', 'ArchiveSummary')]
+
+    users = User.objects.filter(is_superuser=False)
+    if not users.exists() and not any(model.objects.exists() for model in models):
+        return
+
+    depot, _ = Depot.objects.get_or_create(code='MAIN', defaults={'name': 'Main Depot'})
+    for model in models:
+        model.objects.filter(depot__isnull=True).update(depot=depot)
+    DepotMembership.objects.bulk_create([
+        DepotMembership(user=user, depot=depot, is_admin=user.is_staff)
+        for user in users.filter(depot_membership__isnull=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_depot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_depot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 17:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_sync_token_deletion'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reportsnapshot',
+            name='reportsnapshot_range_unique',
+        ),
+        migrations.AddField(
+            model_name='reportsnapshot',
+            name='depot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main.depot'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportsnapshot',
+            constraint=models.UniqueConstraint(fields=('group', 'date_from', 'date_to', 'depot'), name='reportsnapshot_depot_range_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportsnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('depot', None)), fields=('group', 'date_from', 'date_to'), name='reportsnapshot_range_unique'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 
 VEHICLES_TYPE_CHOICES = [
@@ -7,34 +8,279 @@ VEHICLES_TYPE_CHOICES = [
     ('Diesel', 'Diesel'),
 ]
 
+# -----------------------------
+# Depots
+# -----------------------------
+class Depot(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    code = models.CharField(max_length=10, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class DepotMembership(models.Model):
+    # The depot a user works in; depot admins see the whole depot's records
+    # and reports. Superusers work across all depots and need no membership.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='depot_membership')
+    depot = models.ForeignKey(Depot, on_delete=models.CASCADE, related_name='members')
+    is_admin = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.user} @ {self.depot}"
+
+
+def user_depot(user):
+    """The user's depot, or None for users without one (superusers, new sign-ups)."""
+    try:
+        return user.depot_membership.depot
+    except (DepotMembership.DoesNotExist, AttributeError):
+        return None
+
+
+class DepotQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Rows the user may see: everything for superusers, otherwise their depot's slice.
+
+        Users without a depot work in the unassigned (depot NULL) slice.
+        """
+        if user.is_superuser:
+            return self
+        return self.filter(depot=user_depot(user))
+
+
 class Driver(models.Model):
     driver_id = models.CharField(max_length=20, unique=True)
     name = models.CharField(max_length=50)
+    depot = models.ForeignKey(Depot, on_delete=models.PROTECT, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = DepotQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['depot', 'name'], name='driver_depot_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.driver_id})"
 
-class VehicleRecord(models.Model):
+# -----------------------------
+# Vendors
+# -----------------------------
+class Vendor(models.Model):
+    # One row per company bills are paid to. "key" is the normalized name
+    # (see main.vendors.normalize_vendor), so spellings of the same company
+    # resolve to the same vendor.
+    name = models.CharField(max_length=50)
+    key = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class VendorAlias(models.Model):
+    # Other names a vendor is entered under, e.g. "NOC" for Nepal Oil Corporation
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='aliases')
+    name = models.CharField(max_length=50)
+    key = models.CharField(max_length=50, unique=True)
+
+    class Meta:
+        verbose_name_plural = 'vendor aliases'
+
+    def __str__(self):
+        return self.name
+
+
+class VehicleRecordBase(models.Model):
+    # Fields shared by live records and the fiscal-year archive
+    depot = models.ForeignKey(Depot, on_delete=models.PROTECT, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField()
     vehicle_number = models.CharField(max_length=20)
     vehicle_type = models.CharField(max_length=10, choices=VEHICLES_TYPE_CHOICES)
     maintenance_cost = models.DecimalField(max_digits=10, decimal_places=2)
     fuel_cost = models.DecimalField(max_digits=10, decimal_places=2)
-    total_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    # Stored generated column, so bulk_create(), update() and raw imports
+    # can never leave it out of step with the two costs
+    total_cost = models.GeneratedField(
+        expression=models.F('maintenance_cost') + models.F('fuel_cost'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
 
 
     driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, default=None)
 
     paid_to_company = models.CharField(max_length=50)
+    # Resolved from paid_to_company when the record is saved
+    vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, null=True, blank=True)
     bill_number = models.CharField(max_length=50)
     bill_date = models.DateField()
     distance_traveled = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     reason_for_maintenance = models.CharField(max_length=200, blank=True)
 
+    # Set by offline/field clients so retried uploads are stored only once
+    client_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = DepotQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
     def save(self, *args, **kwargs):
-        self.total_cost = (self.maintenance_cost or 0) + (self.fuel_cost or 0)
         super().save(*args, **kwargs)
+        # total_cost is computed by the database; set the same sum here so
+        # this instance doesn't go on showing the old total
+        self.total_cost = (self.maintenance_cost or 0) + (self.fuel_cost or 0)
 
     def __str__(self):
         return f"{self.vehicle_number} - {self.date}"
+
+class VehicleRecord(VehicleRecordBase):
+    class Meta:
+        # Depot-scoped queries filter on depot first, so it leads each index
+        indexes = [
+            models.Index(fields=['depot', 'date'], name='vehiclerecord_depot_date_idx'),
+            models.Index(fields=['depot', 'vehicle_number', 'date'], name='vehiclerecord_depot_veh_idx'),
+            models.Index(fields=['depot', 'driver', 'date'], name='vehiclerecord_depot_drv_idx'),
+            models.Index(fields=['vendor', 'date'], name='vehiclerecord_vendor_date_idx'),
+        ]
+
+
+# -----------------------------
+# Fiscal-year archive
+# -----------------------------
+class ArchivedVehicleRecord(VehicleRecordBase):
+    # Rows moved out of VehicleRecord by the archive_fiscal_years command.
+    # They keep their original id, so ids stay unique across both tables.
+    fiscal_year = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fiscal_year', 'date'], name='archivedrecord_fy_date_idx'),
+            models.Index(fields=['depot', 'date'], name='archivedrecord_depot_date_idx'),
+        ]
+
+
+class ArchiveYear(models.Model):
+    # One row per archived fiscal year (BS year in which it starts, e.g. 2080 for 2080/81)
+    fiscal_year = models.PositiveIntegerField(unique=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    record_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"FY {self.fiscal_year}/{str(self.fiscal_year + 1)[-2:]}"
+
+
+class ArchiveSummary(models.Model):
+    # Per-year totals by driver and vehicle, so summaries of whole archived
+    # years never have to scan ArchivedVehicleRecord
+    fiscal_year = models.PositiveIntegerField()
+    depot = models.ForeignKey(Depot, on_delete=models.PROTECT, null=True, blank=True)
+    driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True)
+    vehicle_number = models.CharField(max_length=20)
+    record_count = models.PositiveIntegerField()
+    maintenance_cost = models.DecimalField(max_digits=14, decimal_places=2)
+    fuel_cost = models.DecimalField(max_digits=14, decimal_places=2)
+    total_cost = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fiscal_year', 'driver'], name='archivesummary_fy_driver_idx'),
+            models.Index(fields=['fiscal_year', 'vehicle_number'], name='archivesummary_fy_vehicle_idx'),
+            models.Index(fields=['depot', 'fiscal_year'], name='archivesummary_depot_fy_idx'),
+        ]
+
+
+class AuditEntry(models.Model):
+    # Append-only change log for VehicleRecord and Driver. Rows are written
+    # in batches by main.audit and never updated; "month" (YYYYMM) is the
+    # partition key used for retention pruning.
+    ACTION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+
+    month = models.PositiveIntegerField(db_index=True)
+    created_at = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+    model_name = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'object_id', 'id'], name='auditentry_object_idx'),
+        ]
+        ordering = ['-id']
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Audit entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.model_name} #{self.object_id} {self.action}"
+
+
+class ReportSnapshot(models.Model):
+    # Stored result of a standard summary report (see main.snapshots). Built
+    # off-peak by the build_report_snapshots command and served by the summary
+    # views when a request asks for exactly this range.
+    name = models.CharField(max_length=30)
+    group = models.CharField(max_length=30)
+    date_from = models.DateField()
+    date_to = models.DateField()
+    # One depot's records, or every depot's when null
+    depot = models.ForeignKey(Depot, on_delete=models.CASCADE, null=True, blank=True)
+    rows = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    built_at = models.DateTimeField()
+    stale = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'date_from', 'date_to', 'depot'],
+                                    name='reportsnapshot_depot_range_unique'),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(fields=['group', 'date_from', 'date_to'], condition=models.Q(depot=None),
+                                    name='reportsnapshot_range_unique'),
+        ]
+
+
+# -----------------------------
+# Sync API
+# -----------------------------
+class SyncToken(models.Model):
+    # API token of a field device (see main.sync). Only a SHA-256 hash of the
+    # key is stored; the key itself is shown to the device once.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_tokens')
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Sync token of {self.user} ({self.created_at:%Y-%m-%d})"
+
+
+class SyncDeletion(models.Model):
+    # Tombstone for a driver or record that left the live tables (deleted or
+    # archived), so sync clients can drop their offline copy
+    MODEL_CHOICES = [
+        ('driver', 'Driver'),
+        ('record', 'Vehicle record'),
+    ]
+
+    model_name = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    # Who may see the tombstone: a record's owner, a driver's depot
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+    depot = models.ForeignKey(Depot, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.model_name} #{self.object_id} deleted"
@@ -0,0 +1,176 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection
+from django.db.models import F, FloatField, Sum, Window
+from django.db.models.functions import Cast, NullIf, Rank, RowNumber
+
+from .archive import archived_records, overlapping_years
+from .models import Driver, VehicleRecord
+
+# Leaderboards computed with window functions, so ranking, running totals
+# and top-N per vehicle all happen in the database. Ranges that reach into
+# archived fiscal years run the same windows over the live and archived
+# rows together (a UNION ALL subquery), so every bill is ranked.
+RANKING_REPORTS = [
+    ('driver_rank', 'Driver Cost per Km'),
+    ('running_total', 'Vehicle Running Spend'),
+    ('recent_bills', 'Latest Bills per Vehicle'),
+]
+
+RECENT_BILLS_PER_VEHICLE = 3
+
+RECORD_FIELDS = [f.attname for f in VehicleRecord._meta.concrete_fields]
+
+CENT = Decimal('0.01')
+
+
+def qn(name):
+    return connection.ops.quote_name(name)
+
+
+def as_decimal(value):
+    # SQLite sums are floats, and neither raw SQL nor aggregates get a
+    # column's rounding, so they are rounded back to the cents of the cost
+    # columns here
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(CENT, ROUND_HALF_UP)
+
+
+# -----------------------------
+# Live rows
+# -----------------------------
+def driver_cost_per_km(records):
+    """Each driver's cost per km, ranked within their vehicle type (cheapest first)."""
+    return (records
+            .values('vehicle_type', 'driver', 'driver__name')
+            .annotate(spend=Sum('total_cost'),
+                      distance=Sum('distance_traveled'))
+            .filter(distance__gt=0)
+            .annotate(cost_per_km=Cast('spend', FloatField()) / NullIf(Cast('distance', FloatField()), 0.0))
+            .annotate(rank=Window(Rank(),
+                                  partition_by=F('vehicle_type'),
+                                  order_by=F('cost_per_km').asc()))
+            .order_by('vehicle_type', 'rank', 'driver__name'))
+
+
+def vehicle_running_total(records):
+    """Every bill with its vehicle's cumulative spend up to and including it."""
+    return (records
+            .annotate(driver_name=F('driver__name'),
+                      running_total=Window(Sum('total_cost'),
+                                           partition_by=F('vehicle_number'),
+                                           order_by=[F('date').asc(), F('id').asc()]))
+            .order_by('vehicle_number', 'date', 'id'))
+
+
+def recent_bills(records, per_vehicle=RECENT_BILLS_PER_VEHICLE):
+    """The latest bills of each vehicle, newest first."""
+    return (records
+            .annotate(driver_name=F('driver__name'),
+                      position=Window(RowNumber(),
+                                      partition_by=F('vehicle_number'),
+                                      order_by=[F('bill_date').desc(), F('id').desc()]))
+            .filter(position__lte=per_vehicle)
+            .order_by('vehicle_number', 'position'))
+
+
+# -----------------------------
+# Live and archived rows
+# -----------------------------
+# A union can't be annotated with a window in the ORM, so these are the same
+# queries in SQL over record_union()
+def record_union(ad_from, ad_to, **filters):
+    """SQL and params of the range's live and archived rows as one UNION ALL."""
+    live = VehicleRecord.objects.filter(date__gte=ad_from, date__lte=ad_to, **filters)
+    archived = archived_records(ad_from, ad_to).filter(**filters)
+    union = live.values(*RECORD_FIELDS).union(archived.values(*RECORD_FIELDS), all=True)
+    return union.query.sql_with_params()
+
+
+def bill_columns(table=None):
+    prefix = f"{qn(table)}." if table else ''
+    return ', '.join(f"{prefix}{qn(name)}" for name in RECORD_FIELDS)
+
+
+def with_driver_names(union):
+    # Each bill with its driver's name joined on, so rows need no driver lookups
+    return (f"SELECT {bill_columns('records')}, {qn('drivers')}.{qn('name')} AS {qn('driver_name')} "
+            f"FROM ({union}) {qn('records')} "
+            f"LEFT JOIN {qn(Driver._meta.db_table)} {qn('drivers')} "
+            f"ON {qn('drivers')}.{qn('id')} = {qn('records')}.{qn('driver_id')}")
+
+
+def union_driver_cost_per_km(union, params):
+    # "* 1.0" keeps SQLite from dividing integer sums as integers
+    sql = (f"SELECT {qn('vehicle_type')}, {qn('driver')}, {qn('driver__name')}, {qn('spend')}, "
+           f"{qn('distance')}, {qn('cost_per_km')}, "
+           f"RANK() OVER (PARTITION BY {qn('vehicle_type')} ORDER BY {qn('cost_per_km')}) AS {qn('rank')} "
+           f"FROM (SELECT {qn('vehicle_type')}, {qn('driver_id')} AS {qn('driver')}, "
+           f"{qn('driver_name')} AS {qn('driver__name')}, "
+           f"SUM({qn('total_cost')}) AS {qn('spend')}, SUM({qn('distance_traveled')}) AS {qn('distance')}, "
+           f"SUM({qn('total_cost')}) * 1.0 / SUM({qn('distance_traveled')}) AS {qn('cost_per_km')} "
+           f"FROM ({with_driver_names(union)}) {qn('bills')} "
+           f"GROUP BY {qn('vehicle_type')}, {qn('driver_id')}, {qn('driver_name')} "
+           f"HAVING SUM({qn('distance_traveled')}) > 0) {qn('totals')} "
+           f"ORDER BY {qn('vehicle_type')}, {qn('rank')}, {qn('driver__name')}")
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        for values in cursor:
+            row = dict(zip(columns, values))
+            row['spend'] = as_decimal(row['spend'])
+            row['distance'] = as_decimal(row['distance'])
+            row['cost_per_km'] = float(row['cost_per_km'])
+            yield row
+
+
+def union_running_total(union, params):
+    sql = (f"SELECT {bill_columns()}, {qn('driver_name')}, "
+           f"SUM({qn('total_cost')}) OVER (PARTITION BY {qn('vehicle_number')} "
+           f"ORDER BY {qn('date')}, {qn('id')}) AS {qn('running_total')} "
+           f"FROM ({with_driver_names(union)}) {qn('bills')} "
+           f"ORDER BY {qn('vehicle_number')}, {qn('date')}, {qn('id')}")
+    # Archived bills come back as (unsaved) VehicleRecord instances too
+    for record in VehicleRecord.objects.raw(sql, params).iterator():
+        record.running_total = as_decimal(record.running_total)
+        yield record
+
+
+def union_recent_bills(union, params, per_vehicle=RECENT_BILLS_PER_VEHICLE):
+    sql = (f"SELECT {bill_columns()}, {qn('driver_name')}, {qn('position')} "
+           f"FROM (SELECT {bill_columns()}, {qn('driver_name')}, "
+           f"ROW_NUMBER() OVER (PARTITION BY {qn('vehicle_number')} "
+           f"ORDER BY {qn('bill_date')} DESC, {qn('id')} DESC) AS {qn('position')} "
+           f"FROM ({with_driver_names(union)}) {qn('bills')}) {qn('numbered')} "
+           f"WHERE {qn('position')} <= %s "
+           f"ORDER BY {qn('vehicle_number')}, {qn('position')}")
+    yield from VehicleRecord.objects.raw(sql, (*params, per_vehicle)).iterator()
+
+
+def live_report(report, records):
+    if report == 'driver_rank':
+        for row in driver_cost_per_km(records).iterator():
+            row['spend'] = as_decimal(row['spend'])
+            row['distance'] = as_decimal(row['distance'])
+            yield row
+    elif report == 'running_total':
+        for record in vehicle_running_total(records).iterator():
+            record.running_total = as_decimal(record.running_total)
+            yield record
+    else:
+        yield from recent_bills(records).iterator()
+
+
+def ranking_report(report, ad_from, ad_to, **filters):
+    """Rows of a ranking report, streamed from the database."""
+    if not overlapping_years(ad_from, ad_to):
+        records = VehicleRecord.objects.filter(date__gte=ad_from, date__lte=ad_to, **filters)
+        return live_report(report, records)
+
+    union, params = record_union(ad_from, ad_to, **filters)
+    if report == 'driver_rank':
+        return union_driver_cost_per_km(union, params)
+    if report == 'running_total':
+        return union_running_total(union, params)
+    return union_recent_bills(union, params)
@@ -0,0 +1,559 @@
+from django.shortcuts import render
+from django.contrib.auth.decorators import user_passes_test
+from django.http import HttpResponse, StreamingHttpResponse
+from nepali_datetime import date as nepali_date
+import csv
+import itertools
+
+from .models import VehicleRecord, Driver, ArchivedVehicleRecord
+from .archive import with_archive
+from .compare import compare_periods, earlier_period, COMPARE_GROUPS, COMPARE_MODES
+from .xlsx import xlsx_response
+from .rankings import ranking_report, RANKING_REPORTS
+from .admission import admission_controlled, compared_periods
+from .snapshots import summary_rows, scope_snapshot, snapshot_rows
+from .vendors import vendor_report
+from .depots import is_depot_admin, report_filters
+from .fiscal import bs_string, bs_string_to_ad
+from .tables import record_rows
+
+# Report and CSV export views
+
+
+def report_driver(request):
+    # A driver id that isn't a number means no driver filter
+    driver_id = request.GET.get('driver', '')
+    return int(driver_id) if driver_id.isdigit() else None
+
+
+# -----------------------------
+# OLD REPORTS
+# -----------------------------
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports(request):
+    scope = report_filters(request)
+    drivers = Driver.objects.filter(**scope).order_by('name')
+    records = VehicleRecord.objects.none()
+    show_message = False
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    driver_id = report_driver(request)
+
+    # Like the other reports, nothing is listed until a date range is chosen
+    if request.GET.get('action'):
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+        if not ad_from or not ad_to:
+            show_message = True
+        else:
+            records = (VehicleRecord.objects.filter(**scope, date__gte=ad_from, date__lte=ad_to)
+                       .select_related('driver').order_by('-date', '-id'))
+            if driver_id:
+                records = records.filter(driver_id=driver_id)
+
+            # Older fiscal years may have been moved to the archive
+            archive_filters = {'driver_id': driver_id} if driver_id else {}
+            records = with_archive(records, ad_from, ad_to, **scope, **archive_filters)
+
+    return render(request, 'main/reports.html', {
+        'drivers': drivers,
+        'records': records,
+        'rows': record_rows(records),
+        'from_date': from_date,
+        'to_date': to_date,
+        'selected_driver': driver_id,
+        'show_message': show_message,
+    })
+
+
+# =====================================================
+# NEW REPORT SYSTEM WITH MESSAGES
+# =====================================================
+
+
+## RAW DATA – BY DRIVER
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports_raw_driver(request):
+    scope = report_filters(request)
+    drivers = Driver.objects.filter(**scope).order_by('name')
+    records = VehicleRecord.objects.none()
+    show_message = False
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    driver_id = report_driver(request)
+    action = request.GET.get('action')
+
+    # Require only date filters; driver is optional
+    if action in ['view', 'csv']:
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+        # An unreadable date would otherwise leave one end of the range open
+        if not ad_from or not ad_to:
+            show_message = True
+        else:
+            records = (VehicleRecord.objects.filter(**scope, date__gte=ad_from, date__lte=ad_to)
+                       .select_related('driver').order_by('-date', '-id'))
+            if driver_id:  # driver filter is optional
+                records = records.filter(driver_id=driver_id)
+
+            # Older fiscal years may have been moved to the archive
+            archive_filters = {'driver_id': driver_id} if driver_id else {}
+            records = with_archive(records, ad_from, ad_to, **scope, **archive_filters)
+
+    # CSV export
+    if action == 'csv' and not show_message:
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="raw_driver.csv"'
+        writer = csv.writer(response)
+        writer.writerow([
+            'Date (BS)', 'Vehicle Number', 'Type', 'Maintenance Cost', 'Fuel Cost',
+            'Total Cost', 'Distance Traveled', 'Driver', 'Paid To', 'Bill Number',
+            'Bill Date (BS)', 'Reason for Maintenance'
+        ])
+        for r in records:
+            writer.writerow([
+                bs_string(r.date), r.vehicle_number, r.vehicle_type, r.maintenance_cost,
+                r.fuel_cost, r.total_cost, r.distance_traveled,
+                r.driver.name if r.driver else '', r.paid_to_company,
+                r.bill_number, bs_string(r.bill_date), r.reason_for_maintenance
+            ])
+        return response
+
+    return render(request, 'main/reports_raw_driver.html', {
+        'drivers': drivers,
+        'records': records,
+        'rows': record_rows(records),
+        'from_date': from_date,
+        'to_date': to_date,
+        'selected_driver': driver_id,
+        'show_message': show_message
+    })
+
+
+
+
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports_summary_driver(request):
+    scope = report_filters(request)
+    drivers = Driver.objects.filter(**scope).order_by('name')
+    summary = None
+    snapshot = None
+    show_message = False
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    driver_id = report_driver(request)
+    action = request.GET.get('action')
+
+    if action in ['view', 'csv']:
+        # Check if dates are provided
+        if not from_date or not to_date:
+            show_message = True
+        else:
+            ad_from = bs_string_to_ad(from_date)
+            ad_to = bs_string_to_ad(to_date)
+
+            # If date conversion fails, show message
+            if not ad_from or not ad_to:
+                show_message = True
+            else:
+                # The standard ranges are precomputed per depot by build_report_snapshots
+                snapshot = None if driver_id else scope_snapshot('driver__name', ad_from, ad_to, scope)
+                if snapshot:
+                    summary = snapshot_rows(snapshot) or None
+                else:
+                    filters = {'driver_id': driver_id} if driver_id else {}
+                    summary = summary_rows('driver__name', ad_from, ad_to, **scope, **filters) or None
+
+    # CSV export
+    if action == 'csv' and summary:
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="summary_driver.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['Driver', 'Total Maintenance', 'Total Fuel', 'Total Cost'])
+        for row in summary:
+            writer.writerow([
+                row.get('driver__name', 'N/A'),
+                row.get('total_maintenance', 0),
+                row.get('total_fuel', 0),
+                row.get('total_cost', 0)
+            ])
+        return response
+
+    return render(request, 'main/reports_summary_driver.html', {
+        'drivers': drivers,
+        'summary': summary,
+        'snapshot': snapshot,
+        'from_date': from_date,
+        'to_date': to_date,
+        'selected_driver': driver_id,
+        'show_message': show_message
+    })
+
+
+
+
+
+
+
+
+#RAW DATA – BY VEHICLE
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports_raw_vehicle(request):
+    records = VehicleRecord.objects.none()
+    show_message = False
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    vehicle_number = request.GET.get('vehicle_number')
+    action = request.GET.get('action')
+
+    # Normalize invalid date inputs
+    if from_date in [None, '', 'None']:
+        from_date = None
+    if to_date in [None, '', 'None']:
+        to_date = None
+
+    # Fetch all distinct vehicle numbers for the dropdown
+    scope = report_filters(request)
+    vehicle_numbers = VehicleRecord.objects.filter(**scope).values_list('vehicle_number', flat=True).union(
+        ArchivedVehicleRecord.objects.filter(**scope).values_list('vehicle_number', flat=True)
+    ).order_by('vehicle_number')
+
+    if action in ['view', 'csv']:
+        # Require both from_date and to_date
+        if not from_date or not to_date:
+            show_message = True
+        else:
+            ad_from = bs_string_to_ad(from_date)
+            ad_to = bs_string_to_ad(to_date)
+
+            # If either conversion fails, show message
+            if not ad_from or not ad_to:
+                show_message = True
+            else:
+                records = VehicleRecord.objects.filter(**scope).select_related('driver').order_by('-date', '-id')
+                records = records.filter(date__gte=ad_from, date__lte=ad_to)
+
+                # Filter by vehicle_number if selected
+                if vehicle_number:
+                    records = records.filter(vehicle_number=vehicle_number)
+
+                # Older fiscal years may have been moved to the archive
+                archive_filters = {'vehicle_number': vehicle_number} if vehicle_number else {}
+                records = with_archive(records, ad_from, ad_to, **scope, **archive_filters)
+
+    # CSV export
+    if action == 'csv' and not show_message:
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="raw_vehicle.csv"'
+        writer = csv.writer(response)
+        writer.writerow([
+            'Date (BS)', 'Vehicle Number', 'Vehicle Type', 'Maintenance Cost',
+            'Fuel Cost', 'Total Cost', 'Distance Traveled', 'Driver',
+            'Paid To', 'Bill Number', 'Bill Date (BS)', 'Reason for Maintenance'
+        ])
+        for r in records:
+            writer.writerow([
+                bs_string(r.date), r.vehicle_number, r.vehicle_type, r.maintenance_cost,
+                r.fuel_cost, r.total_cost, r.distance_traveled,
+                r.driver.name if r.driver else '',
+                r.paid_to_company, r.bill_number,
+                bs_string(r.bill_date) or '',
+                r.reason_for_maintenance
+            ])
+        return response
+
+    # Render template
+    return render(request, 'main/reports_raw_vehicle.html', {
+        'records': records,
+        'rows': record_rows(records),
+        'from_date': from_date,
+        'to_date': to_date,
+        'show_message': show_message,
+        'vehicle_numbers': vehicle_numbers,
+        'selected_vehicle': vehicle_number or ''
+    })
+
+
+
+
+#SUMMARY – BY VEHICLE
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports_summary_vehicle(request):
+    summary = []
+    snapshot = None
+    show_message = False
+    message = ''
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    vehicle_number = request.GET.get('vehicle_number')
+    action = request.GET.get('action')
+
+    # Normalize invalid date inputs
+    if from_date in [None, '', 'None']:
+        from_date = None
+    if to_date in [None, '', 'None']:
+        to_date = None
+
+    # Fetch all distinct vehicle numbers for dropdown
+    scope = report_filters(request)
+    vehicle_numbers = VehicleRecord.objects.filter(**scope).values_list('vehicle_number', flat=True).union(
+        ArchivedVehicleRecord.objects.filter(**scope).values_list('vehicle_number', flat=True)
+    ).order_by('vehicle_number')
+
+    if action in ['view', 'csv']:
+        # Require both dates to be provided
+        if not from_date or not to_date:
+            show_message = True
+            message = 'Both From Date and To Date must be provided.'
+        else:
+            ad_from = bs_string_to_ad(from_date)
+            ad_to = bs_string_to_ad(to_date)
+
+            if not ad_from or not ad_to:
+                show_message = True
+                message = 'Invalid date format provided.'
+            else:
+                # The standard ranges are precomputed per depot by build_report_snapshots
+                snapshot = None if vehicle_number else scope_snapshot('vehicle_number', ad_from, ad_to, scope)
+                if snapshot:
+                    summary = snapshot_rows(snapshot)
+                else:
+                    filters = {'vehicle_number__iexact': vehicle_number} if vehicle_number else {}
+                    summary = summary_rows('vehicle_number', ad_from, ad_to, **scope, **filters)
+
+    if action == 'csv' and not show_message:
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="summary_vehicle.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['Vehicle', 'Maintenance', 'Fuel', 'Total'])
+        for row in summary:
+            writer.writerow([
+                row['vehicle_number'],
+                row['total_maintenance'],
+                row['total_fuel'],
+                row['total_cost']
+            ])
+        return response
+
+    return render(request, 'main/reports_summary_vehicle.html', {
+        'summary': summary,
+        'snapshot': snapshot,
+        'from_date': from_date,
+        'to_date': to_date,
+        'show_message': show_message,
+        'message': message,
+        'vehicle_numbers': vehicle_numbers,
+        'selected_vehicle': vehicle_number or ''
+    })
+
+
+
+
+#PERIOD COMPARISON – BY DRIVER, VEHICLE OR DEPOT
+COMPARE_LABELS = {'driver': 'Driver', 'vehicle': 'Vehicle', 'depot': 'Depot'}
+
+
+@user_passes_test(is_depot_admin)
+@admission_controlled(periods=compared_periods)
+def reports_compare(request):
+    rows = []
+    show_message = False
+    period_error = False
+    periods = None
+
+    scope = report_filters(request)
+    group = request.GET.get('group', 'vehicle')
+    # Comparing depots side by side is a cross-depot report
+    if group not in COMPARE_GROUPS or (group == 'depot' and not request.user.is_superuser):
+        group = 'vehicle'
+    compare = request.GET.get('compare', 'previous')
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    action = request.GET.get('action')
+
+    if action in ['view', 'csv', 'xlsx']:
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+
+        if not ad_from or not ad_to or ad_from > ad_to:
+            show_message = True
+        else:
+            previous = earlier_period(ad_from, ad_to, compare)
+            # The earlier period must still be a BS date range
+            if previous is None:
+                show_message = period_error = True
+            else:
+                prev_from, prev_to = previous
+                rows = compare_periods(group, (ad_from, ad_to), (prev_from, prev_to), **scope)
+                periods = {
+                    'current': f"{from_date} to {to_date}",
+                    'previous': f"{nepali_date.from_datetime_date(prev_from)} to {nepali_date.from_datetime_date(prev_to)}",
+                }
+
+    if action in ['csv', 'xlsx'] and not show_message:
+        table = [[
+            COMPARE_LABELS[group],
+            f"Current ({periods['current']})", f"Previous ({periods['previous']})",
+            'Change', 'Change %', 'Current Bills', 'Previous Bills'
+        ]]
+        for row in rows:
+            table.append([
+                row['group'] or 'N/A', row['current_total'], row['previous_total'], row['delta'],
+                round(row['delta_pct'], 2) if row['delta_pct'] is not None else None,
+                row['current_count'], row['previous_count']
+            ])
+
+        filename = f"compare_{group}"
+        if action == 'xlsx':
+            return xlsx_response(f"{filename}.xlsx", table, sheet_name='Comparison')
+
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        csv.writer(response).writerows(table)
+        return response
+
+    return render(request, 'main/reports_compare.html', {
+        'rows': rows,
+        'group': group,
+        'group_label': COMPARE_LABELS[group],
+        'compare': compare,
+        'compare_modes': COMPARE_MODES,
+        'periods': periods,
+        'from_date': from_date,
+        'to_date': to_date,
+        'show_message': show_message,
+        'period_error': period_error,
+    })
+
+
+
+
+# -----------------------------
+# Streaming CSV export
+# -----------------------------
+class Echo:
+    # csv.writer target that hands each row straight back instead of buffering
+    def write(self, value):
+        return value
+
+
+def streaming_csv(filename, header, rows):
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in itertools.chain([header], rows)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+#RANKINGS – WINDOW FUNCTION REPORTS
+RANKING_COLUMNS = {
+    'driver_rank': (
+        ['Vehicle Type', 'Rank', 'Driver', 'Total Cost', 'Distance (Km)', 'Cost per Km'],
+        lambda r: [r['vehicle_type'], r['rank'], r['driver__name'] or 'N/A', r['spend'],
+                   r['distance'], round(r['cost_per_km'], 2)],
+    ),
+    'running_total': (
+        ['Vehicle Number', 'Date (BS)', 'Driver', 'Paid To', 'Bill Number', 'Total Cost', 'Running Total'],
+        lambda r: [r.vehicle_number, nepali_date.from_datetime_date(r.date),
+                   r.driver_name or '', r.paid_to_company, r.bill_number,
+                   r.total_cost, r.running_total],
+    ),
+    'recent_bills': (
+        ['Vehicle Number', '#', 'Bill Date (BS)', 'Driver', 'Paid To', 'Bill Number', 'Total Cost'],
+        lambda r: [r.vehicle_number, r.position, nepali_date.from_datetime_date(r.bill_date),
+                   r.driver_name or '', r.paid_to_company, r.bill_number, r.total_cost],
+    ),
+}
+
+
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports_ranking(request):
+    rows = None
+    show_message = False
+
+    report = request.GET.get('report')
+    if report not in RANKING_COLUMNS:
+        report = 'driver_rank'
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    action = request.GET.get('action')
+
+    if action in ['view', 'csv']:
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+
+        if not ad_from or not ad_to:
+            show_message = True
+        else:
+            rows = ranking_report(report, ad_from, ad_to, **report_filters(request))
+
+    header, to_row = RANKING_COLUMNS[report]
+
+    if action == 'csv' and not show_message:
+        return streaming_csv(f"ranking_{report}.csv", header, (to_row(r) for r in rows))
+
+    return render(request, 'main/reports_ranking.html', {
+        'report': report,
+        'reports': RANKING_REPORTS,
+        'header': header,
+        'table': [to_row(r) for r in rows] if rows is not None else None,
+        'from_date': from_date,
+        'to_date': to_date,
+        'show_message': show_message
+    })
+
+
+
+
+#VENDOR SPEND
+@user_passes_test(is_depot_admin)
+@admission_controlled
+def reports_vendor(request):
+    report = None
+    show_message = False
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    action = request.GET.get('action')
+
+    if action in ['view', 'csv']:
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+
+        if not ad_from or not ad_to:
+            show_message = True
+        else:
+            report = vendor_report(ad_from, ad_to, **report_filters(request))
+
+    if action == 'csv' and report:
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="vendor_spend.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['Section', 'Group', 'Vendor', 'Bills', 'Spend'])
+        for row in report['overall']:
+            writer.writerow(['All vehicles', '', row['vendor__name'], row['bills'], row['spend']])
+        for section, key in (('Vehicle type', 'by_vehicle_type'), ('Maintenance reason', 'by_reason')):
+            for group, rows in report[key]:
+                for row in rows:
+                    writer.writerow([section, group, row['vendor__name'], row['bills'], row['spend']])
+        return response
+
+    return render(request, 'main/reports_vendor.html', {
+        'report': report,
+        'from_date': from_date,
+        'to_date': to_date,
+        'show_message': show_message
+    })
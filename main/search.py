@@ -0,0 +1,120 @@
+import re
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Full-text index over the fields users actually search bills by, on both
+# the live and the archived record tables. SQLite keeps it in FTS5
+# external-content tables (<table>_fts) synced by triggers, MySQL uses a
+# FULLTEXT index on each table (migrations 0008 and 0010).
+SEARCH_FIELDS = ['bill_number', 'paid_to_company', 'reason_for_maintenance']
+SEARCH_TABLES = ['main_vehiclerecord', 'main_archivedvehiclerecord']
+
+# Archived matches shown under the live results
+ARCHIVE_RESULTS = 50
+
+# A broad prefix ("a*") matches most of the table. Counting, and above all
+# ranking, every match costs far more than the page itself, so counts stop
+# here and larger result sets are listed newest first instead of by rank.
+COUNT_LIMIT = 1000
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    return TOKEN_RE.findall(query or '')
+
+
+def fts5_query(terms):
+    # Every term is quoted (no FTS syntax injection) and prefix matched
+    return ' '.join(f'"{t}"*' for t in terms)
+
+
+def mysql_query(terms):
+    return ' '.join(f'+{t}*' for t in terms)
+
+
+def search_records(records, query, ranked=True):
+    """Filter a record queryset by a free-text query.
+
+    Best match first, or with ranked=False the most recently entered first,
+    which the index returns without looking at every match.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return records.none()
+
+    table = records.model._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        fts = fts_table(table)
+        return records.extra(
+            tables=[fts],
+            where=[f'{fts}.rowid = {table}.id', f'{fts} MATCH %s'],
+            params=[fts5_query(terms)],
+            select={'search_rank': f'{fts}.rank'} if ranked else {},
+            # Ordering on the FTS rowid lets SQLite stop after one page
+            order_by=['search_rank', '-date', '-id'] if ranked else [f'-{fts}.rowid'],
+        )
+
+    if connection.vendor == 'mysql':
+        match = f"MATCH({', '.join(SEARCH_FIELDS)}) AGAINST (%s IN BOOLEAN MODE)"
+        if not ranked:
+            return records.extra(where=[match], params=[mysql_query(terms)]).order_by('-id')
+        return records.extra(
+            where=[match],
+            params=[mysql_query(terms)],
+            select={'search_rank': match},
+            select_params=[mysql_query(terms)],
+            order_by=['-search_rank', '-date', '-id'],
+        )
+
+    # No full-text index on this backend: fall back to substring scans
+    return scan_records(records, terms)
+
+
+class SearchPaginator(Paginator):
+    """Paginator whose count stops at COUNT_LIMIT, so only that many matches are reachable."""
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by().values('pk')[:COUNT_LIMIT + 1].count()
+
+    @property
+    def capped(self):
+        return self.count > COUNT_LIMIT
+
+    @cached_property
+    def num_pages(self):
+        # Don't offer the page past the limit
+        return min(super().num_pages, -(-COUNT_LIMIT // self.per_page))
+
+
+def search_page(records, query, number, per_page=50):
+    """One page of search results, ranked unless there are too many matches to rank."""
+    paginator = SearchPaginator(search_records(records, query), per_page)
+    if paginator.capped:
+        paginator = SearchPaginator(search_records(records, query, ranked=False), per_page)
+    return paginator.get_page(number)
+
+
+def search_archive(records, query):
+    """Same search over an ArchivedVehicleRecord queryset, most recently entered first."""
+    return search_records(records, query, ranked=False)
+
+
+def scan_records(records, terms):
+    condition = Q()
+    for term in terms:
+        term_q = Q()
+        for field in SEARCH_FIELDS:
+            term_q |= Q(**{f'{field}__icontains': term})
+        condition &= term_q
+    return records.filter(condition).order_by('-date', '-id')
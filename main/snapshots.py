@@ -0,0 +1,214 @@
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from nepali_datetime import date as nepali_date
+
+from . import audit
+from .archive import archived_summary, merge_summaries
+from .fiscal import fiscal_year_of, fiscal_year_range
+from .models import Depot, Driver, ReportSnapshot, VehicleRecord
+
+# Precomputed results for the summary reports everyone pulls every morning.
+# build_report_snapshots stores them for every depot and across depots; the
+# summary views serve a snapshot when the requested range and depot match
+# one exactly and it is still fresh.
+DEFAULTS = {
+    'REPORTS': ['yesterday', 'month_to_date', 'fiscal_year_to_date'],
+    'GROUPS': ['driver__name', 'vehicle_number'],
+    'BUILD_AT': '02:00',      # server time of the daily full rebuild
+    'CHECK_INTERVAL': 300,    # seconds between stale checks in --loop mode
+}
+
+TOTAL_FIELDS = ('total_maintenance', 'total_fuel', 'total_cost')
+
+
+def config(name):
+    return getattr(settings, 'REPORT_SNAPSHOTS', {}).get(name, DEFAULTS[name])
+
+
+def today():
+    return nepali_date.today().to_datetime_date()
+
+
+def yesterday(day):
+    return day - datetime.timedelta(days=1), day - datetime.timedelta(days=1)
+
+
+def month_to_date(day):
+    bs = nepali_date.from_datetime_date(day)
+    return nepali_date(bs.year, bs.month, 1).to_datetime_date(), day
+
+
+def fiscal_year_to_date(day):
+    return fiscal_year_range(fiscal_year_of(day))[0], day
+
+
+STANDARD_RANGES = {
+    'yesterday': yesterday,
+    'month_to_date': month_to_date,
+    'fiscal_year_to_date': fiscal_year_to_date,
+}
+
+
+def standard_ranges(day=None):
+    day = day or today()
+    return {name: STANDARD_RANGES[name](day) for name in config('REPORTS')}
+
+
+def summary_rows(group, ad_from, ad_to, **filters):
+    """Live and archived totals per driver or vehicle for a date range."""
+    records = VehicleRecord.objects.filter(date__gte=ad_from, date__lte=ad_to, **filters)
+    return merge_summaries(
+        group,
+        records.values(group).annotate(
+            total_maintenance=Sum('maintenance_cost'),
+            total_fuel=Sum('fuel_cost'),
+            total_cost=Sum('total_cost')
+        ),
+        archived_summary(group, ad_from, ad_to, **filters)
+    )
+
+
+# -----------------------------
+# Building and serving
+# -----------------------------
+def depot_filters(depot_id):
+    # depot_id None is the cross-depot snapshot
+    return {'depot_id': depot_id} if depot_id is not None else {}
+
+
+def build_snapshot(name, group, ad_from, ad_to, depot_id=None):
+    # Taken before reading, so bills saved during the build count as late
+    built_at = timezone.now()
+    rows = summary_rows(group, ad_from, ad_to, **depot_filters(depot_id))
+    snapshot, _ = ReportSnapshot.objects.update_or_create(
+        group=group, date_from=ad_from, date_to=ad_to, depot_id=depot_id,
+        defaults={'name': name, 'rows': rows, 'built_at': built_at, 'stale': False},
+    )
+    return snapshot
+
+
+def is_fresh(snapshot):
+    if snapshot.stale:
+        return False
+    # Bills entered or edited after the build, including bulk updates and
+    # sync pushes that never send post_save
+    return not VehicleRecord.objects.filter(
+        date__gte=snapshot.date_from, date__lte=snapshot.date_to,
+        updated_at__gt=snapshot.built_at, **depot_filters(snapshot.depot_id),
+    ).exists()
+
+
+def fresh_snapshot(group, ad_from, ad_to, depot_id=None):
+    """The snapshot for exactly this range and depot (None: all depots), or None
+    if there is none or it is stale."""
+    snapshot = ReportSnapshot.objects.filter(
+        group=group, date_from=ad_from, date_to=ad_to, depot_id=depot_id).first()
+    if snapshot is None:
+        return None
+    if not is_fresh(snapshot):
+        # Left for the next refresh_snapshots() pass to rebuild
+        if not snapshot.stale:
+            ReportSnapshot.objects.filter(pk=snapshot.pk).update(stale=True)
+        return None
+    return snapshot
+
+
+def scope_snapshot(group, ad_from, ad_to, scope):
+    """fresh_snapshot() for a report limited by report_filters() scope.
+
+    Reports on the unassigned (depot NULL) slice are never precomputed.
+    """
+    if not scope:
+        return fresh_snapshot(group, ad_from, ad_to)
+    depot_id = scope['depot_id'] if 'depot_id' in scope else getattr(scope['depot'], 'pk', None)
+    return fresh_snapshot(group, ad_from, ad_to, depot_id) if depot_id is not None else None
+
+
+def snapshot_rows(snapshot):
+    # JSON stores the totals as strings
+    return [
+        {key: Decimal(value) if key in TOTAL_FIELDS and value is not None else value
+         for key, value in row.items()}
+        for row in snapshot.rows
+    ]
+
+
+def refresh_snapshots(force=False, day=None):
+    """Build missing or stale snapshots for the configured reports (all of them if force).
+
+    Snapshots for ranges that are no longer standard (yesterday's "yesterday")
+    are dropped. Returns the snapshots that were built.
+    """
+    depot_ids = [None, *Depot.objects.order_by('pk').values_list('pk', flat=True)]
+    wanted = {}
+    for name, (ad_from, ad_to) in standard_ranges(day).items():
+        for group in config('GROUPS'):
+            for depot_id in depot_ids:
+                # Two reports can share a range (month_to_date on the 1st)
+                wanted.setdefault((group, ad_from, ad_to, depot_id), name)
+
+    existing = {(s.group, s.date_from, s.date_to, s.depot_id): s for s in ReportSnapshot.objects.all()}
+    built = []
+    for key, name in wanted.items():
+        snapshot = existing.get(key)
+        if force or snapshot is None or not is_fresh(snapshot):
+            built.append(build_snapshot(name, *key))
+
+    outdated = [s.pk for key, s in existing.items() if key not in wanted]
+    if outdated:
+        ReportSnapshot.objects.filter(pk__in=outdated).delete()
+    return built
+
+
+# -----------------------------
+# Invalidation
+# -----------------------------
+def mark_stale(dates=None, depot_ids=None):
+    """Flag the snapshots covering any of these dates (all snapshots if None).
+
+    With depot_ids, only those depots' snapshots and the cross-depot ones.
+    """
+    covering = Q()
+    if dates is not None:
+        dates = [d for d in dates if d is not None]
+        if not dates:
+            return
+        for d in dates:
+            covering |= Q(date_from__lte=d, date_to__gte=d)
+    if depot_ids is not None:
+        covering &= Q(depot__isnull=True) | Q(depot_id__in=[d for d in depot_ids if d is not None])
+    ReportSnapshot.objects.filter(covering, stale=False).update(stale=True)
+
+
+def record_saving(sender, instance, raw=False, **kwargs):
+    # The stored date and depot, so a bill moved out of a range (or depot)
+    # invalidates that one too
+    if not raw:
+        previous = audit.previous_values(instance)
+        instance._snapshot_dates = {previous.get('date')}
+        instance._snapshot_depots = {previous.get('depot_id')}
+
+
+def record_changed(sender, instance, **kwargs):
+    dates = instance.__dict__.pop('_snapshot_dates', set()) | {instance.date}
+    depot_ids = instance.__dict__.pop('_snapshot_depots', set()) | {instance.depot_id}
+    transaction.on_commit(lambda: mark_stale(dates, depot_ids))
+
+
+def driver_changed(sender, instance, **kwargs):
+    # Driver summaries are keyed by name
+    transaction.on_commit(lambda: mark_stale())
+
+
+def connect():
+    pre_save.connect(record_saving, sender=VehicleRecord, dispatch_uid='snapshots_record_presave')
+    post_save.connect(record_changed, sender=VehicleRecord, dispatch_uid='snapshots_record_save')
+    post_delete.connect(record_changed, sender=VehicleRecord, dispatch_uid='snapshots_record_delete')
+    post_save.connect(driver_changed, sender=Driver, dispatch_uid='snapshots_driver_save')
+    post_delete.connect(driver_changed, sender=Driver, dispatch_uid='snapshots_driver_delete')
@@ -0,0 +1,246 @@
+import datetime
+import hashlib
+import secrets
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from nepali_datetime import date as nepali_date
+
+from . import audit
+from .forms import BatchVehicleRecordForm
+from .depots import record_depot
+from .models import VehicleRecord, ArchivedVehicleRecord, Driver, SyncToken, SyncDeletion, user_depot
+from .vendors import assign_vendors
+
+SYNC_MAX_BATCH = 200
+SYNC_PULL_LIMIT = 500
+# How far a pull's cursor stays behind the clock (see pull_changes)
+SYNC_CURSOR_LAG = datetime.timedelta(minutes=5)
+# How long deletion tombstones are kept (prune_sync_deletions); a client
+# whose cursor is older has to start over without a cursor
+SYNC_DELETION_RETENTION_DAYS = 90
+
+
+# -----------------------------
+# Device tokens
+# -----------------------------
+# Field devices send "Authorization: Token <key>" instead of a session
+# cookie, so the API needs no CSRF token.
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue_token(user):
+    """Create a token for one device and return its key (only the hash is stored)."""
+    key = secrets.token_urlsafe(32)
+    SyncToken.objects.create(user=user, key_hash=hash_key(key))
+    return key
+
+
+def token_user(authorization):
+    """The active user an Authorization header's token belongs to, or None."""
+    scheme, _, key = authorization.partition(' ')
+    if scheme != 'Token' or not key.strip():
+        return None
+    token = SyncToken.objects.select_related('user').filter(key_hash=hash_key(key.strip())).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+# -----------------------------
+# Push: idempotent record upload
+# -----------------------------
+def push_records(user, items):
+    """Store a batch of client records, skipping keys that were already stored.
+
+    Returns one compact result per item, in the same order:
+    {"key": ..., "status": "created" | "duplicate" | "error", "id": ..., "errors": ...}
+    """
+    results = [{'key': item.get('client_key') if isinstance(item, dict) else None} for item in items]
+
+    # Keys already on the server are answered with a single indexed lookup
+    keys = [r['key'] for r in results if r['key']]
+    existing = dict(VehicleRecord.objects.filter(client_key__in=keys).values_list('client_key', 'id'))
+    # A late retry of a bill whose year has been archived since
+    existing.update(ArchivedVehicleRecord.objects.filter(client_key__in=keys).values_list('client_key', 'id'))
+
+    today = nepali_date.today().to_datetime_date()
+    pending = {}
+    repeats = []
+    for item, result in zip(items, results):
+        key = result['key']
+        if not key or not isinstance(key, str) or len(key) > 64:
+            result.update(status='error', errors={'client_key': ["A client_key of up to 64 characters is required."]})
+            continue
+        if key in existing:
+            result.update(status='duplicate', id=existing[key])
+            continue
+        if key in pending:
+            # Same key twice in one batch: answered with the first row's id
+            result.update(status='duplicate')
+            repeats.append(result)
+            continue
+
+        form = BatchVehicleRecordForm(data=item, user=user)
+        if not form.is_valid():
+            result.update(status='error', errors=form.errors.get_json_data())
+            continue
+
+        record = form.save(commit=False)
+        record.user = user
+        record.depot = record_depot(user, record.driver)
+        record.client_key = key
+        record.date = today
+        record.fuel_cost = record.fuel_cost or 0
+        record.maintenance_cost = record.maintenance_cost or 0
+        record.distance_traveled = record.distance_traveled or 0
+        result.update(status='created')
+        pending[key] = (record, result)
+
+    if pending:
+        records = [record for record, _ in pending.values()]
+        assign_vendors(records)
+        with transaction.atomic():
+            # A concurrent retry of the same batch may have won the race, so
+            # conflicts are ignored and ids are read back by key
+            VehicleRecord.objects.bulk_create(records, ignore_conflicts=True)
+            ids = dict(VehicleRecord.objects.filter(client_key__in=list(pending))
+                       .values_list('client_key', 'id'))
+            for key, (record, result) in pending.items():
+                record.pk = result['id'] = ids.get(key)
+            audit.record_bulk_create(records)
+
+        for result in repeats:
+            result['id'] = ids.get(result['key'])
+
+    return results
+
+
+# -----------------------------
+# Pull: changes since a cursor
+# -----------------------------
+# The cursor holds a (time, id) position for drivers, records and deletions:
+# "<driver time>~<driver id>~<record time>~<record id>~<deletion time>~<deletion id>".
+#
+# updated_at is set when a row is saved, not when its transaction commits,
+# so a row can become visible after a pull with a time before that pull's
+# last row. Once a stream has been read to the end, its position is set to
+# SYNC_CURSOR_LAG before the time of the pull, and the next pull sends the
+# rows of that window again. Clients apply rows by id, so repeats are
+# harmless.
+def parse_cursor(cursor):
+    if not cursor:
+        return None, None, None
+    parts = cursor.split('~')
+    if len(parts) != 6:
+        raise ValueError("Invalid cursor.")
+    try:
+        d_time, d_id, r_time, r_id, x_time, x_id = parts
+        return ((parse_datetime(d_time), int(d_id)), (parse_datetime(r_time), int(r_id)),
+                (parse_datetime(x_time), int(x_id)))
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+
+
+def make_cursor(*positions):
+    parts = []
+    for pos in positions:
+        parts += [pos[0].isoformat(), str(pos[1])] if pos and pos[0] else ['', '0']
+    return '~'.join(parts)
+
+
+def changed_since(queryset, position, limit, field='updated_at'):
+    if position and position[0]:
+        changed_at, last_id = position
+        queryset = queryset.filter(Q(**{f'{field}__gt': changed_at}) | Q(**{field: changed_at, 'id__gt': last_id}))
+    rows = list(queryset.order_by(field, 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def deletions_for(user):
+    # The user's own records, and drivers of the depot(s) they see
+    drivers = Q(model_name='driver')
+    if not user.is_superuser:
+        drivers &= Q(depot=user_depot(user))
+    return SyncDeletion.objects.filter(Q(model_name='record', user=user) | drivers)
+
+
+def serialize_driver(driver):
+    return {'id': driver.id, 'driver_id': driver.driver_id, 'name': driver.name}
+
+
+def serialize_record(record):
+    return {
+        'id': record.id,
+        'client_key': record.client_key,
+        'date': nepali_date.from_datetime_date(record.date).strftime('%Y-%m-%d'),
+        'vehicle_number': record.vehicle_number,
+        'vehicle_type': record.vehicle_type,
+        'maintenance_cost': str(record.maintenance_cost),
+        'fuel_cost': str(record.fuel_cost),
+        'total_cost': str(record.total_cost),
+        'distance_traveled': str(record.distance_traveled),
+        'driver': record.driver_id,
+        'paid_to_company': record.paid_to_company,
+        'bill_number': record.bill_number,
+        'bill_date': nepali_date.from_datetime_date(record.bill_date).strftime('%Y-%m-%d'),
+        'reason_for_maintenance': record.reason_for_maintenance,
+    }
+
+
+def pull_changes(user, cursor, limit=SYNC_PULL_LIMIT):
+    """Drivers and records changed since the cursor, and the ids of those deleted since.
+
+    Clients apply changes first and deletions last, so a row that was
+    changed and then deleted ends up removed. Rows may be sent again by a
+    later pull (see SYNC_CURSOR_LAG).
+    """
+    driver_pos, record_pos, deletion_pos = parse_cursor(cursor)
+    now = timezone.now()
+    if deletion_pos and deletion_pos[0] and deletion_pos[0] < now - datetime.timedelta(days=SYNC_DELETION_RETENTION_DAYS):
+        # Tombstones after it may have been pruned
+        raise ValueError("Cursor has expired; pull again without a cursor.")
+
+    drivers, more_drivers = changed_since(Driver.objects.for_user(user), driver_pos, limit)
+    records, more_records = changed_since(VehicleRecord.objects.filter(user=user), record_pos, limit)
+    deletions, more_deletions = changed_since(deletions_for(user), deletion_pos, limit, field='deleted_at')
+
+    horizon = (now - SYNC_CURSOR_LAG, 0)
+    driver_pos = horizon if not more_drivers else (drivers[-1].updated_at, drivers[-1].id)
+    record_pos = horizon if not more_records else (records[-1].updated_at, records[-1].id)
+    deletion_pos = horizon if not more_deletions else (deletions[-1].deleted_at, deletions[-1].id)
+
+    return {
+        'drivers': [serialize_driver(d) for d in drivers],
+        'records': [serialize_record(r) for r in records],
+        'deleted': {
+            'drivers': [d.object_id for d in deletions if d.model_name == 'driver'],
+            'records': [d.object_id for d in deletions if d.model_name == 'record'],
+        },
+        'cursor': make_cursor(driver_pos, record_pos, deletion_pos),
+        'has_more': more_drivers or more_records or more_deletions,
+    }
+
+
+# -----------------------------
+# Deletion tombstones
+# -----------------------------
+# Archiving and bulk delete use plain SQL and write their own tombstones
+# (main.archive, main.bulk)
+def record_deleted(sender, instance, **kwargs):
+    # Also sent per row by queryset.delete() (admin)
+    SyncDeletion.objects.create(model_name='record', object_id=instance.pk,
+                                user_id=instance.user_id, depot_id=instance.depot_id)
+
+
+def driver_deleted(sender, instance, **kwargs):
+    SyncDeletion.objects.create(model_name='driver', object_id=instance.pk, depot_id=instance.depot_id)
+
+
+def connect():
+    post_delete.connect(record_deleted, sender=VehicleRecord, dispatch_uid='sync_record_deleted')
+    post_delete.connect(driver_deleted, sender=Driver, dispatch_uid='sync_driver_deleted')
@@ -1,22 +1,35 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, report_views
+
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('home/',views.home, name='home'),
+    path('home/batch/', views.batch_entry, name='batch_entry'),
+    path('home/batch/done/', views.batch_success, name='batch_success'),
     path('success/<int:record_id>/', views.success, name='success'),
     path('login/', views.user_login, name='login'),
     path('logout/',views.user_logout, name='logout'),
     path('register/', views.register, name='register'),
     path('my-records/', views.my_records, name='my_records'),
     path('records/edit/<int:record_id>/', views.edit_record, name='edit_record'),
-    path('reports/', views.reports, name='reports'),
+    path('records/search/', views.search, name='search'),
+    path('records/bulk/', views.bulk_records, name='bulk_records'),
+    path('vendors/suggest/', views.vendor_suggest, name='vendor_suggest'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/sync/token/', views.sync_token, name='sync_token'),
+    path('api/sync/records/', views.sync_push, name='sync_push'),
+    path('api/sync/changes/', views.sync_pull, name='sync_pull'),
+    path('reports/', report_views.reports, name='reports'),
     path('drivers/', views.manage_drivers, name='manage_drivers'),
-    path('reports/raw-driver/', views.reports_raw_driver, name='reports_raw_driver'),
-    path('reports/summary-driver/', views.reports_summary_driver, name='reports_summary_driver'),
-    path('reports/raw-vehicle/', views.reports_raw_vehicle, name='reports_raw_vehicle'),
-    path('reports/summary-vehicle/', views.reports_summary_vehicle, name='reports_summary_vehicle'),
+    path('reports/raw-driver/', report_views.reports_raw_driver, name='reports_raw_driver'),
+    path('reports/summary-driver/', report_views.reports_summary_driver, name='reports_summary_driver'),
+    path('reports/raw-vehicle/', report_views.reports_raw_vehicle, name='reports_raw_vehicle'),
+    path('reports/summary-vehicle/', report_views.reports_summary_vehicle, name='reports_summary_vehicle'),
+    path('reports/compare/', report_views.reports_compare, name='reports_compare'),
+    path('reports/ranking/', report_views.reports_ranking, name='reports_ranking'),
+    path('reports/vendors/', report_views.reports_vendor, name='reports_vendor'),
 
 
     ]
\ No newline at end of file
@@ -0,0 +1,169 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import Lower, Trim
+from django.db.models.signals import pre_save
+from django.utils import timezone
+
+from . import audit
+from .archive import archived_records
+from .models import ArchivedVehicleRecord, Vendor, VendorAlias, VehicleRecord
+
+# paid_to_company stays free text; each record also points at the Vendor its
+# name resolves to, so vendor reports group by an indexed FK instead of
+# normalizing every row at query time.
+LEGAL_SUFFIXES = {'pvt', 'private', 'ltd', 'limited', 'inc', 'co'}
+
+TOP_VENDORS = 5      # per vehicle type / reason
+TOP_OVERALL = 20
+SUGGEST_LIMIT = 10
+
+
+def normalize_vendor(name):
+    """Case, punctuation and whitespace folded, trailing "Pvt. Ltd." etc. dropped.
+
+    Names made only of punctuation give an empty key; they get no vendor.
+    """
+    words = []
+    initials = ''
+    for word in re.sub(r'[^\w\s]', ' ', name.casefold()).split() + ['']:
+        # Initials written as "S.T.P.L." or "S T P L" become one word
+        if len(word) == 1:
+            initials += word
+            continue
+        if initials:
+            words.append(initials)
+            initials = ''
+        if word:
+            words.append(word)
+    stem = list(words)
+    while stem and stem[-1] in LEGAL_SUFFIXES:
+        stem.pop()
+    return ' '.join(stem or words)[:50]
+
+
+def resolve_vendors(names):
+    """Map each name to its Vendor, creating vendors for names never seen before."""
+    keys = {name: normalize_vendor(name) for name in names if name}
+    keys = {name: key for name, key in keys.items() if key}
+    found = {v.key: v for v in Vendor.objects.filter(key__in=set(keys.values()))}
+    missing = set(keys.values()) - found.keys()
+    if missing:
+        for alias in VendorAlias.objects.filter(key__in=missing).select_related('vendor'):
+            found[alias.key] = alias.vendor
+    for name, key in keys.items():
+        if key not in found:
+            found[key], _ = Vendor.objects.get_or_create(key=key, defaults={'name': name.strip()})
+    return {name: found[key] for name, key in keys.items()}
+
+
+def assign_vendors(records):
+    # For bulk_create() paths, which send no pre_save. Names without a key stay vendor=None.
+    vendors = resolve_vendors({r.paid_to_company for r in records})
+    for r in records:
+        r.vendor = vendors.get(r.paid_to_company)
+
+
+def key_prefix(key):
+    # startswith is sent as LIKE ... ESCAPE, which SQLite never answers from
+    # an index, so there the prefix becomes a range on the (unique) key
+    if connection.vendor == 'sqlite':
+        return {'key__gte': key, 'key__lt': key + '\U0010ffff'}
+    return {'key__startswith': key}
+
+
+def suggest(query, records=None):
+    """Vendor names starting with what has been typed, for the form's type-ahead.
+
+    With records (a VehicleRecord queryset), only vendors billed in those
+    records are offered, e.g. the user's depot.
+    """
+    key = normalize_vendor(query)
+    if not key:
+        return []
+    vendors = Vendor.objects.filter(**key_prefix(key))
+    aliases = VendorAlias.objects.filter(**key_prefix(key))
+    if records is not None:
+        vendors = vendors.filter(Exists(records.filter(vendor=OuterRef('pk'))))
+        aliases = aliases.filter(Exists(records.filter(vendor=OuterRef('vendor'))))
+    names = list(vendors.order_by('name').values_list('name', flat=True)[:SUGGEST_LIMIT])
+    if len(names) < SUGGEST_LIMIT:
+        names += [n for n in (aliases
+                              .order_by('vendor__name').values_list('vendor__name', flat=True)
+                              .distinct()[:SUGGEST_LIMIT])
+                  if n not in names]
+    return names[:SUGGEST_LIMIT]
+
+
+def merge_vendors(target, others):
+    """Fold other vendors into target: their records, aliases and names."""
+    with transaction.atomic():
+        for vendor in others:
+            if vendor.pk == target.pk:
+                continue
+            # update() skips auto_now; sync clients and snapshot appends page on updated_at
+            VehicleRecord.objects.filter(vendor=vendor).update(vendor=target, updated_at=timezone.now())
+            ArchivedVehicleRecord.objects.filter(vendor=vendor).update(vendor=target, updated_at=timezone.now())
+            vendor.aliases.update(vendor=target)
+            key, name = vendor.key, vendor.name
+            vendor.delete()
+            VendorAlias.objects.get_or_create(key=key, defaults={'vendor': target, 'name': name})
+
+
+def set_vendor(sender, instance, **kwargs):
+    # Only look the vendor up when the name was typed or changed
+    before = audit.previous_values(instance).get('paid_to_company')
+    if instance.vendor_id is None or before != instance.paid_to_company:
+        assign_vendors([instance])
+
+
+def connect():
+    pre_save.connect(set_vendor, sender=VehicleRecord, dispatch_uid='vendors_record_save')
+
+
+# -----------------------------
+# Vendor spend report
+# -----------------------------
+def spend_rows(ad_from, ad_to, group=None, cost='total_cost', annotations=None, **filters):
+    """Spend and bill count per vendor (and per group), live and archived rows merged."""
+    fields = ['vendor', 'vendor__name'] + ([group] if group else [])
+    merged = {}
+    for records in (VehicleRecord.objects.filter(date__gte=ad_from, date__lte=ad_to),
+                    archived_records(ad_from, ad_to)):
+        rows = (records.filter(vendor__isnull=False, **filters)
+                .annotate(**(annotations or {}))
+                .values(*fields)
+                .annotate(spend=Sum(cost), bills=Count('id'))
+                .order_by())
+        for row in rows:
+            key = tuple(row[f] for f in fields)
+            if key in merged:
+                merged[key]['spend'] += row['spend']
+                merged[key]['bills'] += row['bills']
+            else:
+                merged[key] = row
+    return sorted(merged.values(), key=lambda r: -r['spend'])
+
+
+def top_per_group(rows, group, top=TOP_VENDORS):
+    """[(group value, its top vendors)], biggest group spend first."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[group], []).append(row)
+    ordered = sorted(groups.items(), key=lambda item: -sum(r['spend'] for r in item[1]))
+    return [(value, vendors[:top]) for value, vendors in ordered]
+
+
+def vendor_report(ad_from, ad_to, top=TOP_VENDORS, **filters):
+    return {
+        'overall': spend_rows(ad_from, ad_to, **filters)[:TOP_OVERALL],
+        'by_vehicle_type': top_per_group(spend_rows(ad_from, ad_to, 'vehicle_type', **filters), 'vehicle_type', top),
+        # Maintenance spend only, on bills that give a reason (free text, so case-folded)
+        'by_reason': top_per_group(
+            spend_rows(ad_from, ad_to, 'reason', cost='maintenance_cost',
+                       annotations={'reason': Lower(Trim('reason_for_maintenance'))},
+                       maintenance_cost__gt=0, reason_for_maintenance__gt='', **filters),
+            'reason', top,
+        ),
+    }
@@ -2,13 +2,30 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm
-from django.http import HttpResponse
-from django.db.models import Sum
+from django.contrib import messages
+from django.http import JsonResponse
+from django.urls import reverse
+from django.template.defaultfilters import pluralize
+from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.csrf import csrf_exempt
+from django.db import connection, transaction
+from django.forms import modelformset_factory
 from nepali_datetime import date as nepali_date
-import csv
-
-from .forms import VehicleRecordForm, DriverForm
-from .models import VehicleRecord, Driver
+from functools import wraps
+import json
+from urllib.parse import urlencode
+
+from .forms import VehicleRecordForm, BatchVehicleRecordForm, DriverForm, BulkRecordForm
+from .models import VehicleRecord, ArchivedVehicleRecord, Driver, user_depot
+from .search import search_page, search_archive, ARCHIVE_RESULTS
+from .bulk import apply_bulk_action
+from .vendors import assign_vendors, suggest
+from .depots import is_depot_admin, depot_required, join_default_depot, record_depot, report_filters
+from .tables import record_rows
+from .fiscal import bs_string_to_ad
+from .admission import admission_controlled, controller
+from . import audit
+from . import sync
 
 
 # -----------------------------
@@ -39,6 +56,7 @@ def register(request):
         form = UserCreationForm(request.POST)
         if form.is_valid():
             user = form.save()
+            join_default_depot(user)
             login(request, user)
             return redirect('dashboard')
     else:
@@ -54,13 +72,15 @@ def dashboard(request):
     # This is the post-login landing page
     return render(request, 'main/dashboard.html')
 @login_required(login_url='login')
+@depot_required
 def home(request):
     submitted_record = None
     if request.method == 'POST':
-        form = VehicleRecordForm(request.POST)
+        form = VehicleRecordForm(request.POST, user=request.user)
         if form.is_valid():
             submitted_record = form.save(commit=False)
             submitted_record.user = request.user
+            submitted_record.depot = record_depot(request.user, submitted_record.driver)
 
             # Set date to current Nepali date
             today_bs = nepali_date.today()
@@ -78,7 +98,7 @@ def home(request):
             submitted_record.save()
             return redirect('success', record_id=submitted_record.id)
     else:
-        form = VehicleRecordForm()
+        form = VehicleRecordForm(user=request.user)
         today_bs = nepali_date.today()
         form.fields['date'].initial = today_bs.strftime("%Y-%m-%d")
         form.fields['bill_date'].initial = today_bs.strftime("%Y-%m-%d")
@@ -95,6 +115,80 @@ def home(request):
     })
 
 
+BatchRecordFormSet = modelformset_factory(
+    VehicleRecord,
+    form=BatchVehicleRecordForm,
+    extra=5,
+    max_num=50,
+    validate_max=True,
+)
+
+
+@login_required(login_url='login')
+@depot_required
+def batch_entry(request):
+    today_bs = nepali_date.today()
+    queryset = VehicleRecord.objects.none()
+    show_message = False
+
+    # Rows start with today's bill date, so a row nobody touched counts as unchanged
+    initial = [{'bill_date': today_bs.strftime("%Y-%m-%d")}] * BatchRecordFormSet.max_num
+
+    if request.method == 'POST':
+        formset = BatchRecordFormSet(request.POST, queryset=queryset, prefix='records', initial=initial,
+                                     form_kwargs={'user': request.user})
+        if formset.is_valid():
+            # Blank rows are skipped; every filled row passed the same clean() as the single form
+            records = formset.save(commit=False)
+            for r in records:
+                r.user = request.user
+                r.depot = record_depot(request.user, r.driver)
+                r.date = today_bs.to_datetime_date()
+                r.fuel_cost = r.fuel_cost or 0
+                r.maintenance_cost = r.maintenance_cost or 0
+                r.distance_traveled = r.distance_traveled or 0
+            # bulk_create() sends no pre_save
+            assign_vendors(records)
+
+            if records:
+                with transaction.atomic():
+                    if connection.features.can_return_rows_from_bulk_insert:
+                        VehicleRecord.objects.bulk_create(records)
+                        audit.record_bulk_create(records)
+                    else:
+                        # MySQL returns no ids from a multi-row INSERT; a batch
+                        # is at most max_num rows, so save them one by one
+                        for r in records:
+                            r.save()
+
+                # Redirect, so refreshing the confirmation can't submit the batch again
+                request.session['batch_saved'] = [r.id for r in records]
+                return redirect('batch_success')
+            show_message = True
+    else:
+        formset = BatchRecordFormSet(queryset=queryset, prefix='records', initial=initial[:BatchRecordFormSet.extra],
+                                     form_kwargs={'user': request.user})
+
+    return render(request, 'main/batch_entry.html', {
+        'formset': formset,
+        'today_bs': today_bs.strftime("%Y-%m-%d"),
+        'show_message': show_message
+    })
+
+
+@login_required(login_url='login')
+def batch_success(request):
+    ids = request.session.get('batch_saved')
+    if not ids:
+        return redirect('batch_entry')
+
+    records = VehicleRecord.objects.filter(id__in=ids, user=request.user).select_related('driver').order_by('id')
+    for r in records:
+        r.bs_date = nepali_date.from_datetime_date(r.date)
+        r.bs_bill_date = nepali_date.from_datetime_date(r.bill_date)
+    return render(request, 'main/batch_success.html', {'records': records})
+
+
 @login_required(login_url='login')
 def success(request, record_id):
     record = get_object_or_404(VehicleRecord, id=record_id, user=request.user)
@@ -103,7 +197,13 @@ def success(request, record_id):
     return render(request, 'main/success.html', {'record': record})
 
 
+def own_records(request):
+    # What my_records shows besides the depot: only their own bills, for non-admins
+    return {} if is_depot_admin(request.user) else {'user': request.user}
+
+
 @login_required(login_url='login')
+@admission_controlled(scope=own_records)
 def my_records(request):
     records = VehicleRecord.objects.none()  # ⛔ no query by default
     show_message = False
@@ -122,22 +222,19 @@ def my_records(request):
             if not ad_from or not ad_to:
                 show_message = True
             else:
-                if request.user.is_superuser:
-                    records = VehicleRecord.objects.all()
-                else:
-                    records = VehicleRecord.objects.filter(user=request.user)
+                # Depot admins see their whole depot, everyone else their own
+                # bills; superusers can narrow it down to one depot
+                records = VehicleRecord.objects.for_user(request.user).filter(**report_filters(request),
+                                                                              **own_records(request))
 
                 records = records.filter(
                     date__gte=ad_from,
                     date__lte=ad_to
-                ).order_by('-date', '-id')
-
-                for r in records:
-                    r.bs_date = nepali_date.from_datetime_date(r.date)
-                    r.bs_bill_date = nepali_date.from_datetime_date(r.bill_date)
+                ).select_related('driver').order_by('-date', '-id')
 
     return render(request, 'main/my_records.html', {
         'user_records': records,
+        'rows': record_rows(records, editable=is_depot_admin(request.user)),
         'from_date': from_date,
         'to_date': to_date,
         'show_message': show_message
@@ -145,350 +242,252 @@ def my_records(request):
 
 
 # -----------------------------
-# Admin: Manage Drivers
-# -----------------------------
-@user_passes_test(lambda u: u.is_superuser)
-def manage_drivers(request):
-    if request.method == 'POST':
-        form = DriverForm(request.POST)
-        if form.is_valid():
-            form.save()
-            return redirect('manage_drivers')
-    else:
-        form = DriverForm()
-
-    drivers = Driver.objects.all().order_by('name')
-    return render(request, 'main/drivers.html', {'form': form, 'drivers': drivers})
-
-@user_passes_test(lambda u: u.is_superuser)
-def edit_record(request, record_id):
-    record = get_object_or_404(VehicleRecord, id=record_id)
-
-    if request.method == 'POST':
-        form = VehicleRecordForm(request.POST, instance=record)
-        if form.is_valid():
-            form.save()
-            return redirect('my_records')
-    else:
-        form = VehicleRecordForm(instance=record)
-
-        # Pre-fill BS dates for display
-        record.bs_date = nepali_date.from_datetime_date(record.date)
-        record.bs_bill_date = nepali_date.from_datetime_date(record.bill_date)
-
-        form.fields['date'].initial = record.bs_date.strftime("%Y-%m-%d")
-        form.fields['bill_date'].initial = record.bs_bill_date.strftime("%Y-%m-%d")
-
-    return render(request, 'main/edit_record.html', {
-        'form': form,
-        'record': record
-    })
-
-# -----------------------------
-# Helpers
-# -----------------------------
-def bs_string_to_ad(bs_str):
-    try:
-        y, m, d = map(int, bs_str.split('-'))
-        return nepali_date(y, m, d).to_datetime_date()
-    except:
-        return None
-
-
-# -----------------------------
-# OLD REPORTS
+# Vendor type-ahead for the record forms
 # -----------------------------
-@user_passes_test(lambda u: u.is_superuser)
-def reports(request):
-    drivers = Driver.objects.all().order_by('name')
-    records = VehicleRecord.objects.all().order_by('-date', '-id')
-    return render(request, 'main/reports.html', {'drivers': drivers, 'records': records})
-
-
-# =====================================================
-# NEW REPORT SYSTEM WITH MESSAGES
-# =====================================================
+@login_required(login_url='login')
+@require_GET
+def vendor_suggest(request):
+    # Only vendors billed in the user's depot(s)
+    records = None if request.user.is_superuser else VehicleRecord.objects.for_user(request.user)
+    return JsonResponse({'vendors': suggest(request.GET.get('q', ''), records)})
 
 
-## RAW DATA – BY DRIVER
-@user_passes_test(lambda u: u.is_superuser)
-def reports_raw_driver(request):
-    drivers = Driver.objects.all().order_by('name')
-    records = VehicleRecord.objects.none()
+@login_required(login_url='login')
+def search(request):
+    page = None
+    archived = []
+    more_archived = False
     show_message = False
 
+    query = request.GET.get('q', '').strip()
     from_date = request.GET.get('from_date')
     to_date = request.GET.get('to_date')
-    driver_id = request.GET.get('driver')
-    action = request.GET.get('action')
 
-    # Require only date filters; driver is optional
-    if action in ['view', 'csv']:
-        if not from_date or not to_date:
+    if query:
+        # Date range is optional here, but must be valid when given
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+        if (from_date and not ad_from) or (to_date and not ad_to):
             show_message = True
         else:
-            records = VehicleRecord.objects.all().order_by('-date', '-id')
-            ad_from = bs_string_to_ad(from_date)
-            ad_to = bs_string_to_ad(to_date)
+            filters = {}
+            if not is_depot_admin(request.user):
+                filters['user'] = request.user
             if ad_from:
-                records = records.filter(date__gte=ad_from)
+                filters['date__gte'] = ad_from
             if ad_to:
-                records = records.filter(date__lte=ad_to)
-            if driver_id:  # driver filter is optional
-                records = records.filter(driver_id=driver_id)
+                filters['date__lte'] = ad_to
 
-            for r in records:
+            records = VehicleRecord.objects.for_user(request.user).filter(**filters)
+            page = search_page(records.select_related('driver'), query, request.GET.get('page'))
+
+            for r in page:
                 r.bs_date = nepali_date.from_datetime_date(r.date)
                 r.bs_bill_date = nepali_date.from_datetime_date(r.bill_date)
 
-    # CSV export
-    if action == 'csv' and not show_message:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="raw_driver.csv"'
-        writer = csv.writer(response)
-        writer.writerow([
-            'Date (BS)', 'Vehicle Number', 'Type', 'Maintenance Cost', 'Fuel Cost',
-            'Total Cost', 'Distance Traveled', 'Driver', 'Paid To', 'Bill Number',
-            'Bill Date (BS)', 'Reason for Maintenance'
-        ])
-        for r in records:
-            writer.writerow([
-                r.bs_date, r.vehicle_number, r.vehicle_type, r.maintenance_cost,
-                r.fuel_cost, r.total_cost, r.distance_traveled,
-                r.driver.name if r.driver else '', r.paid_to_company,
-                r.bill_number, r.bs_bill_date, r.reason_for_maintenance
-            ])
-        return response
-
-    return render(request, 'main/reports_raw_driver.html', {
-        'drivers': drivers,
-        'records': records,
+            # Closed fiscal years are searched too, listed below the live matches
+            if page.number == 1:
+                archived = ArchivedVehicleRecord.objects.for_user(request.user).filter(**filters)
+                archived = search_archive(archived.select_related('driver'), query)
+                # One row past the page says there are more
+                archived = list(archived[:ARCHIVE_RESULTS + 1])
+                more_archived = len(archived) > ARCHIVE_RESULTS
+                archived = archived[:ARCHIVE_RESULTS]
+                for r in archived:
+                    r.bs_date = nepali_date.from_datetime_date(r.date)
+                    r.bs_bill_date = nepali_date.from_datetime_date(r.bill_date)
+
+    return render(request, 'main/search.html', {
+        'page': page,
+        'archived': archived,
+        'more_archived': more_archived,
+        'query': query,
         'from_date': from_date,
         'to_date': to_date,
-        'selected_driver': int(driver_id) if driver_id else None,
         'show_message': show_message
     })
 
 
+# -----------------------------
+# Sync API for field/offline clients
+# -----------------------------
+def api_token_required(view):
+    # Devices authenticate with "Authorization: Token <key>", not the session
+    # cookie, so CSRF doesn't apply. JSON clients get a 401, not a redirect.
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = sync.token_user(request.headers.get('Authorization', ''))
+        if user is None:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        request.user = user
+        # AuditMiddleware only saw the anonymous session user
+        audit.set_current_user(user)
+        return view(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+@csrf_exempt
+@require_POST
+def sync_token(request):
+    # A device logs in once with username and password and keeps the token
+    try:
+        credentials = json.loads(request.body)
+        user = authenticate(request, username=credentials['username'], password=credentials['password'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON body like {"username": ..., "password": ...}.'}, status=400)
+    if user is None:
+        return JsonResponse({'error': 'Invalid username or password.'}, status=401)
+    return JsonResponse({'token': sync.issue_token(user)})
+
+
+@require_POST
+@api_token_required
+def sync_push(request):
+    if not request.user.is_superuser and user_depot(request.user) is None:
+        return JsonResponse({'error': 'Your account is not assigned to a depot yet.'}, status=403)
+    try:
+        items = json.loads(request.body)['records']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON body like {"records": [...]}.'}, status=400)
 
+    if not isinstance(items, list) or len(items) > sync.SYNC_MAX_BATCH:
+        return JsonResponse({'error': f'Send a list of at most {sync.SYNC_MAX_BATCH} records.'}, status=400)
 
-@user_passes_test(lambda u: u.is_superuser)
-def reports_summary_driver(request):
-    drivers = Driver.objects.all().order_by('name')
-    summary = None
-    show_message = False
-
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-    driver_id = request.GET.get('driver')
-    action = request.GET.get('action')
+    return JsonResponse({'results': sync.push_records(request.user, items)})
 
-    if action in ['view', 'csv']:
-        # Check if dates are provided
-        if not from_date or not to_date:
-            show_message = True
-        else:
-            ad_from = bs_string_to_ad(from_date)
-            ad_to = bs_string_to_ad(to_date)
 
-            # If date conversion fails, show message
-            if not ad_from or not ad_to:
-                show_message = True
-            else:
-                records = VehicleRecord.objects.all()
-                records = records.filter(date__gte=ad_from, date__lte=ad_to)
-
-                if driver_id:
-                    records = records.filter(driver_id=driver_id)
-
-                if records.exists():
-                    summary = list(
-                        records.values('driver__name').annotate(
-                            total_maintenance=Sum('maintenance_cost'),
-                            total_fuel=Sum('fuel_cost'),
-                            total_cost=Sum('total_cost')
-                        )
-                    )
-                else:
-                    summary = None
-
-    # CSV export
-    if action == 'csv' and summary:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="summary_driver.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Driver', 'Total Maintenance', 'Total Fuel', 'Total Cost'])
-        for row in summary:
-            writer.writerow([
-                row.get('driver__name', 'N/A'),
-                row.get('total_maintenance', 0),
-                row.get('total_fuel', 0),
-                row.get('total_cost', 0)
-            ])
-        return response
-
-    return render(request, 'main/reports_summary_driver.html', {
-        'drivers': drivers,
-        'summary': summary,
-        'from_date': from_date,
-        'to_date': to_date,
-        'selected_driver': int(driver_id) if driver_id else None,
-        'show_message': show_message
-    })
+@require_GET
+@api_token_required
+def sync_pull(request):
+    try:
+        changes = sync.pull_changes(request.user, request.GET.get('cursor'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(changes)
 
 
+# -----------------------------
+# Metrics
+# -----------------------------
+@user_passes_test(lambda u: u.is_superuser)
+def metrics(request):
+    return JsonResponse({'admission': controller.snapshot()})
 
 
+# -----------------------------
+# Admin: Manage Drivers
+# -----------------------------
+@user_passes_test(is_depot_admin)
+def manage_drivers(request):
+    if request.method == 'POST':
+        form = DriverForm(request.POST, user=request.user)
+        if form.is_valid():
+            driver = form.save(commit=False)
+            if not request.user.is_superuser:
+                driver.depot = user_depot(request.user)
+            driver.save()
+            return redirect('manage_drivers')
+    else:
+        form = DriverForm(user=request.user)
 
+    drivers = Driver.objects.for_user(request.user).select_related('depot').order_by('name')
+    return render(request, 'main/drivers.html', {'form': form, 'drivers': drivers})
 
+@user_passes_test(is_depot_admin)
+def edit_record(request, record_id):
+    record = get_object_or_404(VehicleRecord.objects.for_user(request.user), id=record_id)
 
+    if request.method == 'POST':
+        form = VehicleRecordForm(request.POST, instance=record, user=request.user)
+        if form.is_valid():
+            record = form.save(commit=False)
+            if record.depot_id is None or (request.user.is_superuser and 'driver' in form.changed_data):
+                # Superusers' records take the driver's depot, also when they reassign it
+                record.depot = record_depot(request.user, record.driver)
+            record.save()
+            return redirect('my_records')
+    else:
+        form = VehicleRecordForm(instance=record, user=request.user)
 
-#RAW DATA – BY VEHICLE
-@user_passes_test(lambda u: u.is_superuser)
-def reports_raw_vehicle(request):
-    records = VehicleRecord.objects.none()
-    show_message = False
+        # Pre-fill BS dates for display
+        record.bs_date = nepali_date.from_datetime_date(record.date)
+        record.bs_bill_date = nepali_date.from_datetime_date(record.bill_date)
 
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-    vehicle_number = request.GET.get('vehicle_number')
-    action = request.GET.get('action')
+        form.fields['date'].initial = record.bs_date.strftime("%Y-%m-%d")
+        form.fields['bill_date'].initial = record.bs_bill_date.strftime("%Y-%m-%d")
 
-    # Normalize invalid date inputs
-    if from_date in [None, '', 'None']:
-        from_date = None
-    if to_date in [None, '', 'None']:
-        to_date = None
+    return render(request, 'main/edit_record.html', {
+        'form': form,
+        'record': record
+    })
 
-    # Fetch all distinct vehicle numbers for the dropdown
-    vehicle_numbers = VehicleRecord.objects.values_list('vehicle_number', flat=True).distinct().order_by('vehicle_number')
+@user_passes_test(is_depot_admin)
+# Its driver filter is driver_filter; a posted "driver" is the new driver
+@admission_controlled(driver_param='driver_filter')
+def bulk_records(request):
+    drivers = Driver.objects.for_user(request.user).order_by('name')
+    records = VehicleRecord.objects.none()
+    show_message = False
 
-    if action in ['view', 'csv']:
-        # Require both from_date and to_date
-        if not from_date or not to_date:
+    params = request.POST if request.method == 'POST' else request.GET
+    from_date = params.get('from_date')
+    to_date = params.get('to_date')
+    # A driver id that isn't a number means no driver filter
+    driver_id = params.get('driver_filter', '')
+    driver_id = int(driver_id) if driver_id.isdigit() else None
+    vehicle_number = params.get('vehicle_number')
+
+    if from_date or to_date:
+        ad_from = bs_string_to_ad(from_date) if from_date else None
+        ad_to = bs_string_to_ad(to_date) if to_date else None
+        if not ad_from or not ad_to:
             show_message = True
         else:
-            ad_from = bs_string_to_ad(from_date)
-            ad_to = bs_string_to_ad(to_date)
+            records = VehicleRecord.objects.for_user(request.user).filter(date__gte=ad_from, date__lte=ad_to)
+            if driver_id:
+                records = records.filter(driver_id=driver_id)
+            if vehicle_number:
+                records = records.filter(vehicle_number=vehicle_number)
 
-            # If either conversion fails, show message
-            if not ad_from or not ad_to:
-                show_message = True
+    if request.method == 'POST':
+        form = BulkRecordForm(request.POST, user=request.user)
+        if form.is_valid() and not show_message:
+            # Either the ticked rows, or everything matching the filter
+            if request.POST.get('scope') == 'selected':
+                ids = [i for i in request.POST.getlist('record_ids') if i.isdigit()]
+                targets = records.filter(id__in=ids)
             else:
-                records = VehicleRecord.objects.all().order_by('-date', '-id')
-                records = records.filter(date__gte=ad_from, date__lte=ad_to)
+                targets = records
+
+            action = form.cleaned_data['action']
+            value = form.value()
+            affected = apply_bulk_action(targets, action, value, user=request.user)
+            label = dict(form.fields['action'].choices)[action]
+            if value:
+                label += f' → {value}'
+            messages.success(request, f"{label}: {affected} record{pluralize(affected)} affected.")
+            # Back to the same filtered list, so a refresh doesn't repeat the action
+            query = urlencode({
+                'from_date': from_date or '',
+                'to_date': to_date or '',
+                'driver_filter': driver_id or '',
+                'vehicle_number': vehicle_number or '',
+            })
+            return redirect(f"{reverse('bulk_records')}?{query}")
+    else:
+        form = BulkRecordForm(user=request.user)
 
-                # Filter by vehicle_number if selected
-                if vehicle_number:
-                    records = records.filter(vehicle_number=vehicle_number)
+    records = records.select_related('driver').order_by('-date', '-id')
+    for r in records:
+        r.bs_date = nepali_date.from_datetime_date(r.date)
 
-                # Convert dates to BS for display
-                for r in records:
-                    r.bs_date = nepali_date.from_datetime_date(r.date)
-                    if r.bill_date:
-                        r.bs_bill_date = nepali_date.from_datetime_date(r.bill_date)
-                    else:
-                        r.bs_bill_date = None
-
-    # CSV export
-    if action == 'csv' and not show_message:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="raw_vehicle.csv"'
-        writer = csv.writer(response)
-        writer.writerow([
-            'Date (BS)', 'Vehicle Number', 'Vehicle Type', 'Maintenance Cost',
-            'Fuel Cost', 'Total Cost', 'Distance Traveled', 'Driver',
-            'Paid To', 'Bill Number', 'Bill Date (BS)', 'Reason for Maintenance'
-        ])
-        for r in records:
-            writer.writerow([
-                r.bs_date, r.vehicle_number, r.vehicle_type, r.maintenance_cost,
-                r.fuel_cost, r.total_cost, r.distance_traveled,
-                r.driver.name if r.driver else '',
-                r.paid_to_company, r.bill_number,
-                r.bs_bill_date if r.bs_bill_date else '',
-                r.reason_for_maintenance
-            ])
-        return response
-
-    # Render template
-    return render(request, 'main/reports_raw_vehicle.html', {
+    return render(request, 'main/bulk_records.html', {
+        'form': form,
+        'drivers': drivers,
         'records': records,
         'from_date': from_date,
         'to_date': to_date,
+        'selected_driver': driver_id,
+        'vehicle_number': vehicle_number or '',
         'show_message': show_message,
-        'vehicle_numbers': vehicle_numbers,
-        'selected_vehicle': vehicle_number or ''
     })
-
-
-
-
-#SUMMARY – BY VEHICLE
-@user_passes_test(lambda u: u.is_superuser)
-def reports_summary_vehicle(request):
-    summary = []
-    show_message = False
-    message = ''
-
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-    vehicle_number = request.GET.get('vehicle_number')
-    action = request.GET.get('action')
-
-    # Normalize invalid date inputs
-    if from_date in [None, '', 'None']:
-        from_date = None
-    if to_date in [None, '', 'None']:
-        to_date = None
-
-    # Fetch all distinct vehicle numbers for dropdown
-    vehicle_numbers = VehicleRecord.objects.values_list('vehicle_number', flat=True).distinct().order_by('vehicle_number')
-
-    if action in ['view', 'csv']:
-        # Require both dates to be provided
-        if not from_date or not to_date:
-            show_message = True
-            message = 'Both From Date and To Date must be provided.'
-        else:
-            ad_from = bs_string_to_ad(from_date)
-            ad_to = bs_string_to_ad(to_date)
-
-            if not ad_from or not ad_to:
-                show_message = True
-                message = 'Invalid date format provided.'
-            else:
-                records = VehicleRecord.objects.filter(date__gte=ad_from, date__lte=ad_to)
-
-                if vehicle_number:
-                    records = records.filter(vehicle_number__iexact=vehicle_number)
-
-                summary = records.values('vehicle_number').annotate(
-                    total_maintenance=Sum('maintenance_cost'),
-                    total_fuel=Sum('fuel_cost'),
-                    total_cost=Sum('total_cost')
-                )
-
-    if action == 'csv' and not show_message:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="summary_vehicle.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Vehicle', 'Maintenance', 'Fuel', 'Total'])
-        for row in summary:
-            writer.writerow([
-                row['vehicle_number'],
-                row['total_maintenance'],
-                row['total_fuel'],
-                row['total_cost']
-            ])
-        return response
-
-    return render(request, 'main/reports_summary_vehicle.html', {
-        'summary': summary,
-        'from_date': from_date,
-        'to_date': to_date,
-        'show_message': show_message,
-        'message': message,
-        'vehicle_numbers': vehicle_numbers,
-        'selected_vehicle': vehicle_number or ''
-    })
\ No newline at end of file
@@ -46,6 +46,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.audit.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -62,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.depots.depot_context',
             ],
         },
     },
@@ -84,6 +86,32 @@ DATABASES = {
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Depot code new sign-ups join (see main/depots.py). With None, an
+# administrator assigns each new user a depot before they can enter bills.
+DEFAULT_DEPOT = None
+# Audit log: entries are written in batches of this size (or per request / commit)
+AUDIT_BUFFER_SIZE = 100
+
+# Report/export admission control (per process), see main/admission.py.
+# Keep MAX_REPORTS below the worker's thread count so bill entry always has
+# free threads even when every report slot is busy.
+REPORT_ADMISSION = {
+    'MAX_REPORTS': 4,
+    'MAX_HEAVY': 2,
+    'MAX_HEAVY_PER_USER': 1,
+    'HEAVY_ROWS': 20000,
+    'RETRY_AFTER': 30,
+}
+
+# Standard summary reports precomputed by `manage.py build_report_snapshots`,
+# see main/snapshots.py. Run it with --loop as a worker, or from any scheduler.
+REPORT_SNAPSHOTS = {
+    'REPORTS': ['yesterday', 'month_to_date', 'fiscal_year_to_date'],
+    'GROUPS': ['driver__name', 'vehicle_number'],
+    'BUILD_AT': '02:00',
+    'CHECK_INTERVAL': 300,
+}
+
 
 
 # Password validation
@@ -121,3 +149,10 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+# The migrations were generated with BigAutoField ids, which Django 6.0
+# defaults to; 5.2 has to be told.
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'